@@ -4,8 +4,8 @@ import os
 import sys
 import time
 
-from rprec.scrape import run_scraper
-from rprec.recommend import run_recommender
+# the subcommands import their modules when they run, so the scraper doesn't
+# pay for loading spacy, gensim, scikit-learn and pandas
 
 
 def scraper(
@@ -16,6 +16,8 @@ def scraper(
     database_port=5432,
     database_url=None,
 ):
+    from rprec.scrape import run_scraper
+
     if database_url is None:
         try:
             DATABASE_URL = os.environ["DATABASE_URL"]
@@ -51,7 +53,12 @@ def recommender(
     database_port=5432,
     scrape=True,
     top_five=True,
+    save_models=True,
+    parallel=True,
+    duplicates="collapse",
 ):
+    from rprec.recommend import run_recommender
+
     try:
         DATABASE_URL = os.environ["DATABASE_URL"]
     except KeyError:
@@ -83,7 +90,44 @@ def recommender(
         database_port=database_port,
         database_url=DATABASE_URL,
         top_five=top_five,
+        save_models=save_models,
+        parallel=parallel,
+        duplicates=duplicates,
+    )
+
+
+def migrate(
+    database_name=None,
+    database_user=None,
+    database_password=None,
+    database_server=None,
+    database_port=5432,
+):
+    from rprec.db import db_connection, migrate as migrate_database
+
+    try:
+        DATABASE_URL = os.environ["DATABASE_URL"]
+    except KeyError:
+        DATABASE_URL = None
+
+    if (
+        any([database_name, database_user, database_password, database_server])
+        and DATABASE_URL is not None
+    ):
+        sys.stderr.write(
+            "Please either provide explicit connection arguments or a DATABASE_URL (heroku)"
+        )
+        sys.exit(1)
+
+    connection = db_connection(
+        database_name,
+        database_user,
+        database_password,
+        database_server,
+        database_port,
+        DATABASE_URL,
     )
+    migrate_database(connection)
 
 
 def main():
@@ -91,6 +135,7 @@ def main():
         {
             "scraper": scraper,
             "recommender": recommender,
+            "migrate": migrate,
         }
     )
 
@@ -0,0 +1,124 @@
+import logging
+import select
+import threading
+
+import psycopg2
+
+from rprec.db import GENERATION_CHANNEL, db_connection, query_similarity_generation
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level="INFO")
+
+# seconds between checks for a stop request while waiting for notifications
+POLL_TIMEOUT = 5.0
+# seconds to wait before reconnecting after the connection was lost
+RECONNECT_DELAY = 5.0
+
+
+class GenerationListener:
+    """Follow the similar_articles generations the recommender records.
+
+    A background thread LISTENs on the generation channel and calls the
+    subscribed callbacks with the new generation id as soon as a write of
+    similar_articles commits.
+    """
+
+    def __init__(self, database_url):
+        self.database_url = database_url
+        self.generation = None
+        self.callbacks = []
+        self.connection = None
+        self.thread = None
+        self.stopped = threading.Event()
+
+    def subscribe(self, callback):
+        """Call callback(generation) from the listener thread when a generation is recorded
+
+        Notifications aren't handled while a callback runs, so slow work such
+        as downloading models should be handed off to another thread.
+        """
+        self.callbacks.append(callback)
+
+    def start(self):
+        self.thread = threading.Thread(
+            target=self._run, name="generation-listener", daemon=True
+        )
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join(timeout=POLL_TIMEOUT + 1)
+
+    def _set_generation(self, generation):
+        if generation is None or generation == self.generation:
+            return
+        logger.info(f"similar articles generation {generation}")
+        self.generation = generation
+        for callback in self.callbacks:
+            try:
+                callback(generation)
+            except Exception:
+                logger.exception("generation callback failed")
+
+    def listening(self):
+        """Check that the listener is connected and following the generations
+
+        While it isn't, a newer generation may have been recorded unnoticed.
+
+        :rtype: bool
+        """
+        return (
+            self.thread is not None
+            and self.thread.is_alive()
+            and self.connection is not None
+        )
+
+    def _connect(self):
+        connection = db_connection(None, None, None, None, None, self.database_url)
+        try:
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {GENERATION_CHANNEL};")
+            # catch up on any generation recorded while we weren't listening
+            generation = query_similarity_generation(connection)
+        except Exception:
+            connection.close()
+            raise
+        self._set_generation(generation)
+        self.connection = connection
+
+    def _disconnect(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def _handle_notifies(self):
+        self.connection.poll()
+        while self.connection.notifies:
+            notify = self.connection.notifies.pop(0)
+            try:
+                generation = int(notify.payload)
+            except ValueError:
+                logger.warning(f"ignoring generation notification {notify.payload!r}")
+                continue
+            self._set_generation(generation)
+
+    def _run(self):
+        while not self.stopped.is_set():
+            try:
+                if self.connection is None:
+                    self._connect()
+                if select.select([self.connection], [], [], POLL_TIMEOUT) == ([], [], []):
+                    continue
+                self._handle_notifies()
+            except psycopg2.Error as e:
+                logger.warning(f"lost the generation listener connection: {e}")
+                self._disconnect()
+                self.stopped.wait(RECONNECT_DELAY)
+            except Exception:
+                # keep following the generations, a dead listener means stale ETags
+                logger.exception("generation listener failed, reconnecting")
+                self._disconnect()
+                self.stopped.wait(RECONNECT_DELAY)
+        self._disconnect()
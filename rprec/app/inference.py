@@ -0,0 +1,248 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from rprec.artifacts import (
+    DOC2VEC_FILE,
+    LABELS_FILE,
+    TFIDF_FILE,
+    TFIDF_VECTORS_FILE,
+    current_generation_dir,
+    models_available,
+)
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level="INFO")
+
+# local directory the model generations are downloaded to, shared by the
+# workers of a dyno
+MODEL_DIR = os.getenv(
+    "RPREC_MODEL_DIR", os.path.join(tempfile.gettempdir(), "rprec-models")
+)
+# seconds a text query may take before the api gives up on it
+LATENCY_BUDGET = float(os.getenv("RPREC_TEXT_LATENCY_BUDGET", "2.0"))
+# queries arriving within MAX_WAIT seconds of each other share one batch
+MAX_BATCH_SIZE = 16
+MAX_WAIT = 0.01
+# most similar articles a text query may ask for per method
+MAX_TEXT_LIMIT = 50
+# characters in a text query, well under spacy's nlp.max_length of 1,000,000
+MAX_TEXT_LENGTH = 100_000
+
+Models = namedtuple("Models", ["nlp", "tfidf", "tfidf_vectors", "doc2vec", "labels"])
+# lru_cache doesn't stop two threads loading the same generation at once
+_load_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def load_models(generation_dir):
+    """Load a model generation saved by the recommender, once per worker process.
+
+    The arrays are memory-mapped so all the workers share them, the previous
+    generation is released when a new one is loaded.
+
+    :param generation_dir: the generation directory
+    :type generation_dir: str
+    :return: the loaded models
+    :rtype: Models
+    """
+    # the ml stack is imported here so it doesn't slow down the api startup
+    import joblib
+
+    from gensim.models.doc2vec import Doc2Vec
+
+    from rprec.app.shared import attach_csr
+    from rprec.recommend import load_spacy
+
+    nlp = load_spacy()
+    tfidf = joblib.load(os.path.join(generation_dir, TFIDF_FILE), mmap_mode="r")
+    tfidf_vectors = attach_csr(generation_dir, TFIDF_VECTORS_FILE)
+    doc2vec = Doc2Vec.load(os.path.join(generation_dir, DOC2VEC_FILE), mmap="r")
+    with open(os.path.join(generation_dir, LABELS_FILE)) as f:
+        labels = json.load(f)
+    logger.info(f"loaded models from {generation_dir}")
+    return Models(nlp, tfidf, tfidf_vectors, doc2vec, labels)
+
+
+def load_current_models(model_dir):
+    """Load the model generation the recommender last published to model_dir"""
+    with _load_lock:
+        try:
+            return load_models(current_generation_dir(model_dir))
+        except FileNotFoundError:
+            # the generation was pruned after CURRENT was read, a newer one replaced it
+            return load_models(current_generation_dir(model_dir))
+
+
+def similar_to_texts(models, raw_texts, limit):
+    """Find the articles most similar to each of the raw texts.
+
+    :param models: the loaded models
+    :type models: Models
+    :param raw_texts: List of texts
+    :type raw_texts: list
+    :param limit: number of similar articles to return per text and method
+    :type limit: int
+    :return: a dict per text of [(similar slug, score),] for "cosine" and "doc2vec"
+    :rtype: list
+    """
+    from sklearn.metrics.pairwise import linear_kernel
+
+    from rprec.recommend import spacy_tokenizer
+
+    processed_texts = spacy_tokenizer(raw_texts, nlp=models.nlp)
+    # tfidf rows are l2 normalized so the dot product is the cosine similarity
+    cosine_similarities = linear_kernel(
+        models.tfidf.transform(processed_texts), models.tfidf_vectors
+    )
+    results = []
+    for i, tokens in enumerate(processed_texts):
+        if not tokens:
+            # nothing but stopwords, there's nothing to compare
+            results.append({"cosine": [], "doc2vec": []})
+            continue
+        top_indices = cosine_similarities[i].argsort()[: -limit - 1 : -1]
+        # articles sharing no terms with the text score 0, they aren't similar
+        cosine_results = [
+            (models.labels[j], float(cosine_similarities[i][j]))
+            for j in top_indices
+            if cosine_similarities[i][j] > 0
+        ]
+        doc_vector = models.doc2vec.infer_vector(tokens, epochs=10)
+        d2v_results = [
+            (slug, float(score))
+            for slug, score in models.doc2vec.dv.most_similar(
+                [doc_vector], topn=limit
+            )
+            if score > 0
+        ]
+        results.append({"cosine": cosine_results, "doc2vec": d2v_results})
+    return results
+
+
+def log_preload_error(future):
+    """Log why a background preload failed, queries load the models themselves"""
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("preloading the models failed", exc_info=future.exception())
+
+
+class MicroBatcher:
+    """Queue concurrent text queries so they share one pass through the models"""
+
+    def __init__(
+        self,
+        model_dir,
+        database_url,
+        max_batch_size=MAX_BATCH_SIZE,
+        max_wait=MAX_WAIT,
+    ):
+        self.model_dir = model_dir
+        self.database_url = database_url
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue = None
+        self.worker = None
+        # downloads and loads run one at a time, off the event loop and the
+        # generation listener thread
+        self.preloader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="preload")
+        self.preloading = None
+
+    async def start(self):
+        self.queue = asyncio.Queue()
+        self.worker = asyncio.create_task(self._run())
+        # warm up in the background so the first query doesn't pay for it
+        self.preloading = self.preload()
+
+    def preload(self, generation=None):
+        """Download a model generation, the latest by default, and load it ahead of the next query
+
+        :param generation: the generation to download
+        :type generation: int
+        :return: the future of the download and load, failures are logged
+        :rtype: concurrent.futures.Future
+        """
+        future = self.preloader.submit(self._preload, generation)
+        future.add_done_callback(log_preload_error)
+        return future
+
+    def _preload(self, generation):
+        from rprec.app.shared import sync
+
+        sync(self.model_dir, self.database_url, generation)
+        if models_available(self.model_dir):
+            load_current_models(self.model_dir)
+
+    async def stop(self):
+        if self.worker is not None:
+            self.worker.cancel()
+        self.preloader.shutdown(wait=False)
+
+    async def submit(self, text, limit):
+        """Queue a text and wait for its similar articles"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((text, limit, future))
+        return await future
+
+    def _infer(self, texts, limit):
+        return similar_to_texts(load_current_models(self.model_dir), texts, limit)
+
+    async def _next_batch(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # drop queries that ran out of their latency budget while queued
+        return [item for item in batch if not item[2].done()]
+
+    async def _infer_batch(self, texts, limit):
+        """Infer a batch, text by text if it fails so a bad text only fails its own query
+
+        :return: a result or the exception it raised for each text
+        :rtype: list
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(None, self._infer, texts, limit)
+        except Exception as e:
+            logger.exception("text similarity batch failed")
+            if len(texts) == 1:
+                return [e]
+        results = []
+        for text in texts:
+            try:
+                [result] = await loop.run_in_executor(None, self._infer, [text], limit)
+            except Exception as e:
+                result = e
+            results.append(result)
+        return results
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            if not batch:
+                continue
+            texts, limits, futures = zip(*batch)
+            results = await self._infer_batch(list(texts), max(limits))
+            for future, limit, result in zip(futures, limits, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(
+                        {method: scores[:limit] for method, scores in result.items()}
+                    )
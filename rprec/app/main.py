@@ -1,14 +1,27 @@
+import time
+
+_import_started = time.perf_counter()
+
+import asyncio
+import logging
+import os
+import re
+
 from typing import List, Optional
 
-from fastapi import Depends, FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 
 from sqlalchemy.orm import Session
 
-from . import queries, models, schemas
-from .database import SessionLocal, engine
+from . import generations, inference, queries, models, schemas
+from .database import DATABASE_URL, SessionLocal, engine
 
-models.Base.metadata.create_all(bind=engine)
+logger = logging.getLogger(__name__)
+logging.basicConfig(level="INFO")
+
+# seconds a cold start (imports and startup events) should stay under
+STARTUP_TARGET = float(os.getenv("RPREC_STARTUP_TARGET", "3.0"))
 
 app = FastAPI()
 
@@ -22,6 +35,48 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+batcher = inference.MicroBatcher(inference.MODEL_DIR, DATABASE_URL)
+listener = generations.GenerationListener(DATABASE_URL)
+
+
+@app.on_event("startup")
+def create_tables():
+    models.Base.metadata.create_all(bind=engine)
+
+
+@app.on_event("startup")
+async def start_batcher():
+    await batcher.start()
+
+
+@app.on_event("startup")
+def start_generation_listener():
+    # the recommender stores its models with the similar_articles generation
+    listener.subscribe(batcher.preload)
+    listener.start()
+
+
+@app.on_event("startup")
+def log_startup_time():
+    startup_time = time.perf_counter() - _import_started
+    if startup_time > STARTUP_TARGET:
+        logger.warning(
+            f"startup took {startup_time:.2f}s, over the {STARTUP_TARGET:.2f}s target"
+        )
+    else:
+        logger.info(f"startup took {startup_time:.2f}s")
+
+
+@app.on_event("shutdown")
+async def stop_batcher():
+    await batcher.stop()
+
+
+@app.on_event("shutdown")
+def stop_generation_listener():
+    listener.stop()
+
+
 # Dependency
 def get_db():
     db = SessionLocal()
@@ -31,6 +86,46 @@ def get_db():
         db.close()
 
 
+# the entity tags of an If-None-Match header, or *
+ENTITY_TAG = re.compile(r'\*|(?:W/)?"[^"]*"')
+
+
+def etag_matches(if_none_match: Optional[str], etag: str):
+    """Check an If-None-Match header against an ETag using the weak comparison.
+
+    :param if_none_match: the header, a comma separated list of entity tags or *
+    :param etag: the current ETag
+    :return: True if the client already has the current representation
+    """
+    if if_none_match is None:
+        return False
+    for tag in ENTITY_TAG.findall(if_none_match):
+        # proxies may weaken the tag, W/"1-a" still names the same generation
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == "*" or tag == etag:
+            return True
+    return False
+
+
+def similar_articles_etag(request: Request, response: Response, slug: str):
+    """Tag similar articles responses with the similar_articles generation.
+
+    Responses aren't tagged while the listener isn't following the generations,
+    a newer one might have been recorded.
+
+    :return: a 304 response if the client already has this generation, else None
+    """
+    if listener.generation is None or not listener.listening():
+        return None
+    etag = f'"{listener.generation}-{slug}"'
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return None
+
+
 @app.get(
     "/articles/", response_model=List[schemas.Article], response_model_include={"slug"}
 )
@@ -55,8 +150,15 @@ def article_info(slug: str, db: Session = Depends(get_db)):
     response_model_include={"slug", "similar_slug", "cosine_similarity"},
 )
 def top_n_cosine_similarity(
-    slug: str, db: Session = Depends(get_db), limit: Optional[int] = 3
+    slug: str,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    limit: Optional[int] = 3,
 ):
+    not_modified = similar_articles_etag(request, response, slug)
+    if not_modified is not None:
+        return not_modified
     article = queries.get_cosine(db, slug=slug, limit=limit)
     if article is None:
         raise HTTPException(status_code=404, detail="Article slug not found")
@@ -69,9 +171,59 @@ def top_n_cosine_similarity(
     response_model_include={"slug", "similar_slug", "doc2vec_similarity"},
 )
 def top_n_doc2vec_similarity(
-    slug: str, db: Session = Depends(get_db), limit: Optional[int] = 3
+    slug: str,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    limit: Optional[int] = 3,
 ):
+    not_modified = similar_articles_etag(request, response, slug)
+    if not_modified is not None:
+        return not_modified
     article = queries.get_doc2vec(db, slug=slug, limit=limit)
     if article is None:
         raise HTTPException(status_code=404, detail="Article slug not found")
     return article
+
+
+async def similar_to_text(text: str, limit: int):
+    if not inference.models_available(inference.MODEL_DIR):
+        raise HTTPException(
+            status_code=503, detail="Similarity models are not available"
+        )
+    try:
+        return await asyncio.wait_for(
+            batcher.submit(text, limit), timeout=inference.LATENCY_BUDGET
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Text similarity timed out")
+
+
+@app.post(
+    "/articles/similar/cosine/text/",
+    response_model=List[schemas.SimilarText],
+    response_model_include={"similar_slug", "cosine_similarity"},
+)
+async def text_cosine_similarity(
+    query: schemas.TextQuery, limit: int = Query(3, ge=1, le=inference.MAX_TEXT_LIMIT)
+):
+    results = await similar_to_text(query.text, limit)
+    return [
+        {"similar_slug": slug, "cosine_similarity": score}
+        for slug, score in results["cosine"]
+    ]
+
+
+@app.post(
+    "/articles/similar/doc2vec/text/",
+    response_model=List[schemas.SimilarText],
+    response_model_include={"similar_slug", "doc2vec_similarity"},
+)
+async def text_doc2vec_similarity(
+    query: schemas.TextQuery, limit: int = Query(3, ge=1, le=inference.MAX_TEXT_LIMIT)
+):
+    results = await similar_to_text(query.text, limit)
+    return [
+        {"similar_slug": slug, "doc2vec_similarity": score}
+        for slug, score in results["doc2vec"]
+    ]
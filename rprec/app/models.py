@@ -1,5 +1,15 @@
-from sqlalchemy import Column, Integer, String, Text, REAL
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+    Text,
+    REAL,
+)
 from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
 from sqlalchemy.sql.schema import ForeignKey
 
 from .database import Base
@@ -12,6 +22,9 @@ class Article(Base):
     slug = Column(String(200), unique=True, index=True)
     author = Column("author", String(50))
     text = Column("text", Text)
+    # near-duplicate detection, see rprec.dedup
+    minhash = Column("minhash", LargeBinary)
+    duplicate_of = Column("duplicate_of", String(200))
 
     similar_articles = relationship("SimilarArticle", back_populates="query_article")
 
@@ -26,3 +39,40 @@ class SimilarArticle(Base):
     doc2vec_similarity = Column(REAL)
 
     query_article = relationship("Article", back_populates="similar_articles")
+
+    # covering indexes for the top-n lookups in queries.get_cosine and
+    # queries.get_doc2vec, these also live in schema.sql and rprec.db
+    __table_args__ = (
+        Index(
+            "similar_articles_slug_cosine_idx",
+            slug,
+            cosine_similarity.desc(),
+            postgresql_include=["similar_slug", "doc2vec_similarity", "id"],
+        ),
+        Index(
+            "similar_articles_slug_doc2vec_idx",
+            slug,
+            doc2vec_similarity.desc(),
+            postgresql_include=["similar_slug", "cosine_similarity", "id"],
+        ),
+    )
+
+
+class SimilarityGeneration(Base):
+    __tablename__ = "similarity_generations"
+
+    id = Column(Integer, primary_key=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    similarity_count = Column(Integer, nullable=False)
+
+
+class ModelFile(Base):
+    __tablename__ = "model_files"
+
+    generation_id = Column(
+        Integer,
+        ForeignKey("similarity_generations.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    name = Column(String(200), primary_key=True)
+    data = Column(LargeBinary, nullable=False)
@@ -11,7 +11,7 @@ def list_articles(db: Session, skip: int = 0, limit: int = 10000):
     return db.query(models.Article).offset(skip).limit(limit).all()
 
 
-def get_cosine(db: Session, slug: str, limit: int = 3):
+def cosine_query(db: Session, slug: str, limit: int = 3):
     return (
         db.query(models.SimilarArticle)
         .filter(
@@ -20,11 +20,14 @@ def get_cosine(db: Session, slug: str, limit: int = 3):
         )
         .order_by(models.SimilarArticle.cosine_similarity.desc())
         .limit(limit)
-        .all()
     )
 
 
-def get_doc2vec(db: Session, slug: str, limit: int = 3):
+def get_cosine(db: Session, slug: str, limit: int = 3):
+    return cosine_query(db, slug=slug, limit=limit).all()
+
+
+def doc2vec_query(db: Session, slug: str, limit: int = 3):
     return (
         db.query(models.SimilarArticle)
         .filter(
@@ -33,5 +36,8 @@ def get_doc2vec(db: Session, slug: str, limit: int = 3):
         )
         .order_by(models.SimilarArticle.doc2vec_similarity.desc())
         .limit(limit)
-        .all()
     )
+
+
+def get_doc2vec(db: Session, slug: str, limit: int = 3):
+    return doc2vec_query(db, slug=slug, limit=limit).all()
@@ -1,7 +1,9 @@
 from math import isnan
-from typing import List
+from typing import List, Optional
 
-from pydantic import BaseModel as PydanticBaseModel, validator
+from pydantic import BaseModel as PydanticBaseModel, Field, validator
+
+from .inference import MAX_TEXT_LENGTH
 
 
 class BaseModel(PydanticBaseModel):
@@ -37,3 +39,13 @@ class Article(ArticleBase):
 
     class Config:
         orm_mode = True
+
+
+class TextQuery(BaseModel):
+    text: str = Field(..., min_length=1, max_length=MAX_TEXT_LENGTH)
+
+
+class SimilarText(BaseModel):
+    similar_slug: str
+    cosine_similarity: Optional[float] = None
+    doc2vec_similarity: Optional[float] = None
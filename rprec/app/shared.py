@@ -0,0 +1,140 @@
+import fcntl
+import logging
+import os
+import shutil
+
+from rprec.artifacts import (
+    CSR_PARTS,
+    current_generation,
+    current_generation_dir,
+    new_generation,
+    publish_generation,
+)
+from rprec.db import db_connection, query_model_files, query_model_generation
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level="INFO")
+
+# the model generations the recommender stores in the database are downloaded
+# to a local model directory, and their read-only arrays are memory-mapped from
+# there, so all uvicorn workers of a dyno share the same pages of the page cache
+# instead of each holding a copy. Running this module before uvicorn downloads
+# the latest generation and pages it in once, before the workers start.
+READ_CHUNK_SIZE = 1 << 20
+LOCK_FILE = ".lock"
+
+
+def attach_array(generation_dir, file_name):
+    """Memory-map a read-only array of a model generation.
+
+    :param generation_dir: the generation directory
+    :type generation_dir: str
+    :param file_name: .npy file name
+    :type file_name: str
+    :rtype: numpy.memmap
+    """
+    import numpy as np
+
+    return np.load(os.path.join(generation_dir, file_name), mmap_mode="r")
+
+
+def attach_csr(generation_dir, name):
+    """Memory-map a sparse matrix saved by rprec.artifacts.save_csr.
+
+    :param generation_dir: the generation directory
+    :type generation_dir: str
+    :param name: file name prefix
+    :type name: str
+    :rtype: scipy.sparse.csr_matrix
+    """
+    from scipy.sparse import csr_matrix
+
+    data, indices, indptr, shape = (
+        attach_array(generation_dir, f"{name}.{part}.npy") for part in CSR_PARTS
+    )
+    # the parts keep their saved dtypes, so scipy uses the mapped arrays as is
+    return csr_matrix((data, indices, indptr), shape=tuple(shape), copy=False)
+
+
+def sync(model_dir, database_url, generation=None):
+    """Download a model generation from the database and make it the current one.
+
+    Workers of the same dyno share the model directory, a file lock makes sure
+    only one of them downloads a generation.
+
+    :param model_dir: the api's local model directory
+    :type model_dir: str
+    :param database_url: url of the database the recommender stores the models in
+    :type database_url: str
+    :param generation: the generation to download, defaults to the latest one
+    :type generation: int
+    :return: the current generation id, None if there's none
+    :rtype: int
+    """
+    os.makedirs(model_dir, exist_ok=True)
+    with open(os.path.join(model_dir, LOCK_FILE), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        connection = db_connection(None, None, None, None, None, database_url)
+        try:
+            if generation is None:
+                generation = query_model_generation(connection)
+            current = current_generation(model_dir)
+            if generation is None or (current is not None and generation <= current):
+                return current
+            model_files = query_model_files(connection, generation)
+        finally:
+            connection.close()
+        if not model_files:
+            # the recommender ran without saving its models
+            return current
+        generation_dir = new_generation(model_dir, generation)
+        try:
+            for file_name, data in model_files:
+                with open(os.path.join(generation_dir, file_name), "wb") as f:
+                    f.write(data)
+            publish_generation(model_dir, generation_dir, generation)
+        except BaseException:
+            # don't leave a partial generation behind, e.g. when the disk is full
+            shutil.rmtree(generation_dir, ignore_errors=True)
+            raise
+    logger.info(f"downloaded model generation {generation}")
+    return generation
+
+
+def warm(model_dir):
+    """Read the current model generation into the page cache.
+
+    :param model_dir: directory the recommender saves the models to
+    :type model_dir: str
+    :return: number of bytes read
+    :rtype: int
+    """
+    generation_dir = current_generation_dir(model_dir)
+    if generation_dir is None:
+        logger.info("no model generation published, nothing to warm")
+        return 0
+    size = 0
+    for file_name in sorted(os.listdir(generation_dir)):
+        with open(os.path.join(generation_dir, file_name), "rb") as f:
+            while True:
+                chunk = f.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+    logger.info(f"warmed {size / 2 ** 20:.1f} MiB of models from {generation_dir}")
+    return size
+
+
+if __name__ == "__main__":
+    from rprec.app.inference import MODEL_DIR
+
+    # the models are optional, uvicorn starts after this whatever happens and
+    # the api downloads them once they're recorded
+    try:
+        sync(MODEL_DIR, os.environ["DATABASE_URL"])
+    except Exception as e:
+        logger.warning(f"could not download the models: {e!r}")
+    try:
+        warm(MODEL_DIR)
+    except Exception as e:
+        logger.warning(f"could not warm the models: {e!r}")
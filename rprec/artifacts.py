@@ -0,0 +1,139 @@
+import os
+import shutil
+
+# files the recommender writes to a model generation for the api, kept in a
+# module without heavy imports so the api can check for them at startup
+TFIDF_FILE = "tfidf.joblib"
+TFIDF_VECTORS_FILE = "tfidf_vectors"
+DOC2VEC_FILE = "doc2vec.model"
+LABELS_FILE = "labels.json"
+
+# the recommender stores each run's model files in the database, the api
+# downloads them to a generation directory in its local model directory and
+# CURRENT, swapped atomically once a download is complete, names the one to serve
+GENERATIONS_DIR = "generations"
+CURRENT_FILE = "CURRENT"
+PARTIAL_SUFFIX = ".partial"
+# a sparse matrix is stored as one .npy file per part so it can be memory-mapped
+CSR_PARTS = ("data", "indices", "indptr", "shape")
+
+
+def current_generation_dir(model_dir):
+    """Return the directory of the model generation the api should serve
+
+    :param model_dir: the api's local model directory
+    :type model_dir: str
+    :return: the generation directory, None if no generation was published
+    :rtype: str
+    """
+    generation = current_generation(model_dir)
+    if generation is None:
+        return None
+    return os.path.join(model_dir, GENERATIONS_DIR, generation_name(generation))
+
+
+def current_generation(model_dir):
+    """Return the id of the model generation the api should serve
+
+    :param model_dir: the api's local model directory
+    :type model_dir: str
+    :return: the generation id, None if no generation was published
+    :rtype: int
+    """
+    if model_dir is None:
+        return None
+    try:
+        with open(os.path.join(model_dir, CURRENT_FILE)) as f:
+            return int(f.read().strip())
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        # a corrupt CURRENT is replaced by the next download
+        return None
+
+
+def generation_name(generation):
+    """Name a generation directory so the names sort in generation order"""
+    return f"{generation:010d}"
+
+
+def models_available(model_dir):
+    """Check that a model generation was published to model_dir
+
+    :param model_dir: the api's local model directory
+    :type model_dir: str
+    :rtype: bool
+    """
+    return current_generation_dir(model_dir) is not None
+
+
+def new_generation(model_dir, generation):
+    """Create an empty directory to download a model generation to
+
+    :param model_dir: the api's local model directory
+    :type model_dir: str
+    :param generation: the generation id
+    :type generation: int
+    :return: the new generation directory
+    :rtype: str
+    """
+    generation_dir = os.path.join(
+        model_dir, GENERATIONS_DIR, generation_name(generation) + PARTIAL_SUFFIX
+    )
+    shutil.rmtree(generation_dir, ignore_errors=True)
+    os.makedirs(generation_dir)
+    return generation_dir
+
+
+def publish_generation(model_dir, generation_dir, generation):
+    """Point the api at a complete model generation and remove old generations
+
+    The previously published generation is kept so workers still serving it
+    can finish, directories of downloads in progress are left alone.
+
+    :param model_dir: the api's local model directory
+    :type model_dir: str
+    :param generation_dir: the generation directory from new_generation
+    :type generation_dir: str
+    :param generation: the generation id
+    :type generation: int
+    """
+    previous = current_generation(model_dir)
+    os.replace(
+        generation_dir,
+        os.path.join(model_dir, GENERATIONS_DIR, generation_name(generation)),
+    )
+    current_path = os.path.join(model_dir, CURRENT_FILE)
+    tmp_path = f"{current_path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(str(generation))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, current_path)
+
+    # workers that still have an older generation mapped keep their pages
+    keep = {generation_name(generation)}
+    if previous is not None:
+        keep.add(generation_name(previous))
+    generations_dir = os.path.join(model_dir, GENERATIONS_DIR)
+    for name in os.listdir(generations_dir):
+        if name not in keep and not name.endswith(PARTIAL_SUFFIX):
+            shutil.rmtree(os.path.join(generations_dir, name), ignore_errors=True)
+
+
+def save_csr(generation_dir, name, matrix):
+    """Save a sparse matrix so the api can memory-map it, see rprec.app.shared.attach_csr
+
+    :param generation_dir: the generation directory from new_generation
+    :type generation_dir: str
+    :param name: file name prefix
+    :type name: str
+    :param matrix: the matrix to save
+    :type matrix: scipy.sparse.csr_matrix
+    """
+    import numpy as np
+
+    matrix = matrix.tocsr()
+    parts = (matrix.data, matrix.indices, matrix.indptr, np.array(matrix.shape))
+    for part, array in zip(CSR_PARTS, parts):
+        np.save(os.path.join(generation_dir, f"{name}.{part}.npy"), array)
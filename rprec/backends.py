@@ -0,0 +1,192 @@
+import joblib
+import logging
+import numpy as np
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from gensim.models.doc2vec import Doc2Vec, TaggedDocument
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics import pairwise_distances
+
+from rprec.artifacts import DOC2VEC_FILE, TFIDF_FILE, TFIDF_VECTORS_FILE, save_csr
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level="INFO")
+
+
+def identity_tokenizer(text):
+    """dummy tokenizer for TfidfVectorizer"""
+    return text
+
+
+def fit_tfidf(processed_texts):
+    """Fit a tfidf vectorizer on the article tokens.
+
+    :param processed_texts: list of article tokens
+    :type processed_texts: list
+    :return: the fitted vectorizer and the article vectors
+    :rtype: tuple
+    """
+    tfidf = TfidfVectorizer(
+        tokenizer=identity_tokenizer,
+        lowercase=False,
+        ngram_range=(1, 1),
+        min_df=0.025,
+        max_df=0.5,
+    )
+    vectors = tfidf.fit_transform(processed_texts)
+    return tfidf, vectors
+
+
+def tagged_docs_to_vectors(model, tagged_docs):
+    """Make vectors suitable for downstream ML tasks"""
+    sents = tagged_docs
+    regressors = [model.infer_vector(document.words, epochs=10) for document in sents]
+    return np.array(regressors)
+
+
+def top_k(similarities, k):
+    """Return the k highest scoring columns of each row, best first.
+
+    :param similarities: (n_articles, n_articles) similarity matrix
+    :type similarities: numpy.ndarray
+    :param k: number of neighbours to keep per article
+    :type k: int
+    :return: (indices, scores) arrays of shape (n_articles, k)
+    :rtype: tuple
+    """
+    k = min(k, similarities.shape[1])
+    indices = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+    scores = np.take_along_axis(similarities, indices, axis=1)
+    order = np.argsort(-scores, axis=1, kind="stable")
+    return (
+        np.take_along_axis(indices, order, axis=1),
+        np.take_along_axis(scores, order, axis=1),
+    )
+
+
+class SimilarityBackend:
+    """A method of scoring how similar the articles are to each other.
+
+    Subclasses set ``column``, the similar_articles column their scores are
+    written to, and implement ``neighbors``. Backends are run in separate
+    processes so they must be picklable.
+    """
+
+    column = None
+
+    def neighbors(self, processed_texts, labels, k, model_dir=None):
+        """Find the k most similar articles to each article.
+
+        :param processed_texts: list of article tokens
+        :type processed_texts: list
+        :param labels: article slugs in the same order as processed_texts
+        :type labels: list
+        :param k: number of neighbours to keep per article
+        :type k: int
+        :param model_dir: If set, the directory to save the fitted model to for the api.
+        :type model_dir: str
+        :return: (indices, scores) arrays of shape (n_articles, k), best first
+        :rtype: tuple
+        """
+        raise NotImplementedError
+
+
+class TfidfCosineBackend(SimilarityBackend):
+    """Cosine similarity of the tfidf article vectors"""
+
+    column = "cosine_similarity"
+
+    def neighbors(self, processed_texts, labels, k, model_dir=None):
+        tfidf, vectors = fit_tfidf(processed_texts)
+        if model_dir is not None:
+            joblib.dump(tfidf, os.path.join(model_dir, TFIDF_FILE))
+            save_csr(model_dir, TFIDF_VECTORS_FILE, vectors)
+        # convert to similarity using 1 minus distance
+        similarities = 1 - pairwise_distances(vectors, vectors, metric="cosine")
+        return top_k(similarities, k)
+
+
+class Doc2VecBackend(SimilarityBackend):
+    """Cosine similarity of the inferred doc2vec vectors to the trained ones"""
+
+    column = "doc2vec_similarity"
+
+    def neighbors(self, processed_texts, labels, k, model_dir=None):
+        tagged_docs = [
+            TaggedDocument(doc, [label]) for doc, label in zip(processed_texts, labels)
+        ]
+        model = Doc2Vec(vector_size=100, min_count=2, epochs=50)
+        model.build_vocab(tagged_docs)
+        logger.info("Training doc2vec model...")
+        model.train(tagged_docs, total_examples=model.corpus_count, epochs=model.epochs)
+        if model_dir is not None:
+            # store every array in its own file so the model can be memory-mapped
+            model.save(os.path.join(model_dir, DOC2VEC_FILE), sep_limit=0)
+        doc_vectors = tagged_docs_to_vectors(model, tagged_docs)
+        trained_vectors = np.vstack([model.dv[label] for label in labels])
+        doc_vectors /= np.linalg.norm(doc_vectors, axis=1, keepdims=True)
+        trained_vectors /= np.linalg.norm(trained_vectors, axis=1, keepdims=True)
+        return top_k(doc_vectors @ trained_vectors.T, k)
+
+
+# the methods run by the recommender, in the order of their database columns
+BACKENDS = [TfidfCosineBackend(), Doc2VecBackend()]
+
+
+def run_backends(backends, processed_texts, labels, k, model_dir=None, parallel=True):
+    """Find the neighbours of every article with each backend.
+
+    :param backends: the similarity backends to run
+    :type backends: list
+    :param processed_texts: list of article tokens
+    :type processed_texts: list
+    :param labels: article slugs in the same order as processed_texts
+    :type labels: list
+    :param k: number of neighbours to keep per article
+    :type k: int
+    :param model_dir: If set, the directory the backends save their fitted models to.
+    :type model_dir: str
+    :param parallel: If True, run each backend in its own process.
+    :type parallel: bool
+    :return: (indices, scores) for each backend
+    :rtype: list
+    """
+    if not parallel:
+        return [
+            backend.neighbors(processed_texts, labels, k, model_dir)
+            for backend in backends
+        ]
+    with ProcessPoolExecutor(max_workers=len(backends)) as executor:
+        futures = [
+            executor.submit(backend.neighbors, processed_texts, labels, k, model_dir)
+            for backend in backends
+        ]
+        return [future.result() for future in futures]
+
+
+def merge_neighbors(labels, neighbors):
+    """Combine the neighbours found by each backend into database rows.
+
+    Pairs of articles missing from a backend's neighbours get a score of -1.0.
+
+    :param labels: article slugs
+    :type labels: list
+    :param neighbors: (indices, scores) for each backend
+    :type neighbors: list
+    :return: rows of (slug, similar slug, score for each backend)
+    :rtype: list
+    """
+    n_articles = len(labels)
+    rows = np.arange(n_articles)[:, None]
+    # encode each (article, similar article) pair as one integer
+    pair_keys = [(rows * n_articles + indices).ravel() for indices, _ in neighbors]
+    all_keys = np.unique(np.concatenate(pair_keys))
+    scores = np.full((len(all_keys), len(neighbors)), -1.0)
+    for column, (keys, (_, backend_scores)) in enumerate(zip(pair_keys, neighbors)):
+        scores[np.searchsorted(all_keys, keys), column] = backend_scores.ravel()
+
+    labels = np.asarray(labels, dtype=object)
+    slugs = labels[all_keys // n_articles].tolist()
+    similar_slugs = labels[all_keys % n_articles].tolist()
+    return list(zip(slugs, similar_slugs, *scores.T.tolist()))
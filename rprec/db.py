@@ -1,4 +1,5 @@
 import logging
+import os
 import psycopg2
 import sys
 
@@ -7,6 +8,36 @@ from psycopg2.extras import execute_values
 logger = logging.getLogger(__name__)
 logging.basicConfig(level="INFO")
 
+# covering indexes for the top n similarity lookups in rprec.app.queries,
+# keyed on slug and ordered by score so a lookup is an index only scan
+SIMILARITY_INDEXES = [
+    """CREATE INDEX IF NOT EXISTS similar_articles_slug_cosine_idx
+    ON similar_articles (slug, cosine_similarity DESC)
+    INCLUDE (similar_slug, doc2vec_similarity, id);""",
+    """CREATE INDEX IF NOT EXISTS similar_articles_slug_doc2vec_idx
+    ON similar_articles (slug, doc2vec_similarity DESC)
+    INCLUDE (similar_slug, cosine_similarity, id);""",
+]
+
+# tables added after schema.sql was first deployed are created by migrate
+# every write of similar_articles records a generation and notifies this
+# channel with its id when the transaction commits, see rprec.app.generations
+GENERATION_CHANNEL = "similar_articles_generation"
+GENERATION_TABLE = """CREATE TABLE IF NOT EXISTS similarity_generations (
+    id serial PRIMARY KEY,
+    created_at timestamp with time zone NOT NULL DEFAULT now(),
+    similarity_count integer NOT NULL
+);"""
+# the recommender's fitted models, stored with their similarity generation so
+# the api dynos can download them, only the latest few generations are kept
+MODEL_FILES_TABLE = """CREATE TABLE IF NOT EXISTS model_files (
+    generation_id integer NOT NULL REFERENCES similarity_generations (id) ON DELETE CASCADE,
+    name character varying(200) NOT NULL,
+    data bytea NOT NULL,
+    PRIMARY KEY (generation_id, name)
+);"""
+KEEP_MODEL_GENERATIONS = 2
+
 
 def db_connection(
     database_name,
@@ -69,17 +100,22 @@ def query_database_slugs(connection):
     return slugs
 
 
-def query_articles(connection):
+def query_articles(connection, with_duplicate_of=False):
     """Query the Real Python articles from the db.
 
     :param connection: psycopg2 connection
     :type connection: psycopg2.extensions.connection
-    :return: list of tuples as [(slug, text),]
+    :param with_duplicate_of: If True, also return the slug each article is a near-duplicate of.
+    :type with_duplicate_of: bool
+    :return: list of tuples as [(slug, text),] or [(slug, text, duplicate_of),]
     :rtype: list
     """
     try:
         cursor = connection.cursor()
-        sql = """SELECT slug, text FROM articles"""
+        if with_duplicate_of:
+            sql = """SELECT slug, text, duplicate_of FROM articles"""
+        else:
+            sql = """SELECT slug, text FROM articles"""
         cursor.execute(sql)
         articles = cursor.fetchall()
     except psycopg2.Error as e:
@@ -96,14 +132,14 @@ def query_articles(connection):
 def write_article_to_database(article_object, connection):
     """write a new entry into the real python article text db.
 
-    :param article_ojbect: dictionary with author and text fields
-    :type article_object: dict
+    :param article_ojbect: (slug, author, text, minhash signature bytes, duplicate_of slug)
+    :type article_object: tuple
     :param connection: psycopg2 connection object
     :type connection: psycopg2 connection object
     """
     try:
         cursor = connection.cursor()
-        sql = """INSERT INTO articles (slug, author, text) VALUES (%s, %s, %s);"""
+        sql = """INSERT INTO articles (slug, author, text, minhash, duplicate_of) VALUES (%s, %s, %s, %s, %s);"""
         cursor.execute(sql, article_object)
         connection.commit()
         logger.info(f"wrote {article_object[0]} to the database")
@@ -116,22 +152,130 @@ def write_article_to_database(article_object, connection):
             connection.close()
 
 
-def write_similarities_to_database(results, connection):
+def migrate(connection):
+    """bring an older database up to the current schema.sql, run once per release
+
+    Adds the near-duplicate columns to the articles table and the tables
+    recording the similarity generations and their models. The ALTER TABLE
+    statements lock the articles table, so the jobs don't run this themselves.
+
+    :param connection: psycopg2 connection object
+    :type connection: psycopg2 connection object
+    :raises psycopg2.Error: if the migration failed
+    """
+    try:
+        cursor = connection.cursor()
+        cursor.execute("ALTER TABLE articles ADD COLUMN IF NOT EXISTS minhash bytea;")
+        cursor.execute(
+            "ALTER TABLE articles ADD COLUMN IF NOT EXISTS duplicate_of character varying(200);"
+        )
+        cursor.execute(GENERATION_TABLE)
+        cursor.execute(MODEL_FILES_TABLE)
+        connection.commit()
+        logger.info("migrated the database")
+    except psycopg2.Error as e:
+        sys.stderr.write(f"Error while migrating the database in PostgreSQL: {e}")
+        # fail the release, the jobs and the api need the migrated schema
+        raise
+    finally:
+        # closing database connection.
+        if connection:
+            cursor.close()
+            connection.close()
+
+
+def query_article_signatures(connection):
+    """Query the MinHash signatures of the articles, in the order they were scraped.
+
+    :param connection: psycopg2 connection
+    :type connection: psycopg2.extensions.connection
+    :return: list of tuples as [(slug, text, minhash, duplicate_of),], text is None if the minhash is set
+    :rtype: list
+    """
+    try:
+        cursor = connection.cursor()
+        # only articles scraped before near-duplicate detection need their text
+        sql = """SELECT slug, CASE WHEN minhash IS NULL THEN text END, minhash, duplicate_of
+        FROM articles ORDER BY id"""
+        cursor.execute(sql)
+        signatures = cursor.fetchall()
+    except psycopg2.Error as e:
+        sys.stderr.write(f"Error while fetching data from PostgreSQL: {e}")
+    finally:
+        # closing database connection.
+        if connection:
+            cursor.close()
+            connection.close()
+
+    return signatures
+
+
+def write_article_signatures(signatures, connection):
+    """record the MinHash signatures of articles that were scraped without one
+
+    :param signatures: list of tuples (slug, minhash signature bytes, duplicate_of slug)
+    :type signatures: list
+    :param connection: psycopg2 connection object
+    :type connection: psycopg2 connection object
+    """
+    try:
+        cursor = connection.cursor()
+        sql_string = """UPDATE articles SET minhash = v.minhash, duplicate_of = v.duplicate_of
+        FROM (VALUES %s) AS v (slug, minhash, duplicate_of) WHERE articles.slug = v.slug;"""
+        execute_values(cursor, sql_string, signatures)
+        connection.commit()
+        logger.info(f"recorded {len(signatures)} article signatures to the database")
+    except psycopg2.Error as e:
+        sys.stderr.write(f"Error while updating data in PostgreSQL: {e}")
+    finally:
+        # closing database connection.
+        if connection:
+            cursor.close()
+            connection.close()
+
+
+def write_similarities_to_database(
+    results,
+    connection,
+    columns=("cosine_similarity", "doc2vec_similarity"),
+    model_dir=None,
+):
     """record the new top 3 most similar articles by cosine similarity values
 
-    :param results: list of tuples (slug, similar slug, cosine sim value)
+    :param results: list of tuples (slug, similar slug, a value for each score column)
     :type results: list
     :param connection: psycopg2 connection object
     :type connection: psycopg2 connection object
+    :param columns: the similar_articles score columns, in the order of the values in results
+    :type columns: list
+    :param model_dir: If set, a directory of model files to record with the similarities.
+    :type model_dir: str
     """
     try:
         cursor = connection.cursor()
+        # the generation, its models and its notification are only visible once
+        # the new similarities are committed. The models are written before the
+        # TRUNCATE so its lock, which blocks the api's lookups, isn't held while
+        # they upload
+        cursor.execute(
+            "INSERT INTO similarity_generations (similarity_count) VALUES (%s) RETURNING id;",
+            (len(results),),
+        )
+        generation = cursor.fetchone()[0]
+        if model_dir is not None:
+            write_model_files(cursor, generation, model_dir)
         # clear the table first
         cursor.execute("TRUNCATE TABLE similar_articles;")
-        sql_string = "INSERT INTO similar_articles (slug, similar_slug, cosine_similarity, doc2vec_similarity) VALUES %s;"
+        sql_string = f"INSERT INTO similar_articles (slug, similar_slug, {', '.join(columns)}) VALUES %s;"
         execute_values(cursor, sql_string, results)
+        create_similarity_indexes(cursor)
+        cursor.execute("SELECT pg_notify(%s, %s);", (GENERATION_CHANNEL, str(generation)))
         connection.commit()
-        logger.info(f"recorded article similarities to the database")
+        logger.info(f"recorded article similarities generation {generation} to the database")
+        # refresh the visibility map and planner statistics, VACUUM can't run
+        # inside a transaction block
+        connection.autocommit = True
+        cursor.execute("VACUUM ANALYZE similar_articles;")
     except psycopg2.Error as e:
         sys.stderr.write(f"Error while inserting data into PostgreSQL: {e}")
     finally:
@@ -139,3 +283,88 @@ def write_similarities_to_database(results, connection):
         if connection:
             cursor.close()
             connection.close()
+
+
+def create_similarity_indexes(cursor):
+    """create the covering indexes used by the similarity lookups if they are missing
+
+    :param cursor: psycopg2 cursor
+    :type cursor: psycopg2.extensions.cursor
+    """
+    for sql in SIMILARITY_INDEXES:
+        cursor.execute(sql)
+
+
+def query_similarity_generation(connection):
+    """Query the id of the latest similarity generation.
+
+    :param connection: psycopg2 connection, left open
+    :type connection: psycopg2.extensions.connection
+    :return: the generation id, None if no similarities were recorded since generations were added
+    :rtype: int
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass('similarity_generations');")
+        if cursor.fetchone()[0] is None:
+            return None
+        cursor.execute("SELECT max(id) FROM similarity_generations;")
+        return cursor.fetchone()[0]
+
+
+def write_model_files(cursor, generation, model_dir):
+    """record the files of a model directory with a similarity generation and drop old ones
+
+    :param cursor: psycopg2 cursor
+    :type cursor: psycopg2.extensions.cursor
+    :param generation: the similarity generation id
+    :type generation: int
+    :param model_dir: directory of model files
+    :type model_dir: str
+    """
+    for name in sorted(os.listdir(model_dir)):
+        with open(os.path.join(model_dir, name), "rb") as f:
+            cursor.execute(
+                "INSERT INTO model_files (generation_id, name, data) VALUES (%s, %s, %s);",
+                (generation, name, psycopg2.Binary(f.read())),
+            )
+    cursor.execute(
+        """DELETE FROM model_files WHERE generation_id NOT IN (
+        SELECT DISTINCT generation_id FROM model_files
+        ORDER BY generation_id DESC LIMIT %s);""",
+        (KEEP_MODEL_GENERATIONS,),
+    )
+    logger.info(f"recorded the models in {model_dir} to the database")
+
+
+def query_model_generation(connection):
+    """Query the id of the latest similarity generation that has model files.
+
+    :param connection: psycopg2 connection, left open
+    :type connection: psycopg2.extensions.connection
+    :return: the generation id, None if no models were recorded
+    :rtype: int
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass('model_files');")
+        if cursor.fetchone()[0] is None:
+            return None
+        cursor.execute("SELECT max(generation_id) FROM model_files;")
+        return cursor.fetchone()[0]
+
+
+def query_model_files(connection, generation):
+    """Query the model files recorded with a similarity generation.
+
+    :param connection: psycopg2 connection, left open
+    :type connection: psycopg2.extensions.connection
+    :param generation: the similarity generation id
+    :type generation: int
+    :return: list of tuples as [(file name, data),]
+    :rtype: list
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name, data FROM model_files WHERE generation_id = %s;",
+            (generation,),
+        )
+        return [(name, bytes(data)) for name, data in cursor.fetchall()]
@@ -0,0 +1,136 @@
+import numpy as np
+import zlib
+
+from collections import defaultdict
+
+# number of hash functions in a signature, split into BANDS bands for lsh
+NUM_PERM = 128
+BANDS = 16
+# words per shingle
+SHINGLE_SIZE = 5
+# estimated jaccard similarity above which two articles are near-duplicates
+THRESHOLD = 0.8
+
+_PRIME = (1 << 31) - 1
+# fixed seed, signatures stored in the database must stay comparable
+_random_state = np.random.RandomState(42)
+_A = _random_state.randint(1, _PRIME, size=NUM_PERM).astype(np.uint64)
+_B = _random_state.randint(0, _PRIME, size=NUM_PERM).astype(np.uint64)
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """Split a text into the set of its overlapping word n-grams.
+
+    :param text: article text
+    :type text: str
+    :param size: number of words per shingle
+    :type size: int
+    :return: set of shingles
+    :rtype: set
+    """
+    words = text.lower().split()
+    return {" ".join(words[i : i + size]) for i in range(len(words) - size + 1)}
+
+
+def minhash(text):
+    """Compute the MinHash signature of an article text.
+
+    :param text: article text
+    :type text: str
+    :return: signature of NUM_PERM values, None if the text is too short to shingle
+    :rtype: numpy.ndarray
+    """
+    article_shingles = shingles(text)
+    if not article_shingles:
+        return None
+    hashes = np.array(
+        [zlib.crc32(shingle.encode("utf-8")) for shingle in article_shingles],
+        dtype=np.uint64,
+    )
+    hashes %= _PRIME
+    # all values stay below 2 ** 62, so the uint64 arithmetic can't overflow
+    return ((np.outer(hashes, _A) + _B) % _PRIME).min(axis=0).astype(np.uint32)
+
+
+# stored for articles too short to shingle, so they aren't re-checked every
+# run like the articles that were scraped before they had a signature (NULL)
+EMPTY_SIGNATURE = b""
+
+
+def signature_to_bytes(signature):
+    """Serialize a signature for the articles.minhash column"""
+    return EMPTY_SIGNATURE if signature is None else signature.tobytes()
+
+
+def signature_from_bytes(data):
+    """Deserialize a signature from the articles.minhash column"""
+    if data is None or len(data) == 0:
+        return None
+    return np.frombuffer(bytes(data), dtype=np.uint32)
+
+
+def jaccard(signature, other):
+    """Estimate the jaccard similarity of two articles from their signatures"""
+    return float(np.mean(signature == other))
+
+
+class LSHIndex:
+    """Locality sensitive hashing index of article signatures.
+
+    Articles whose signatures agree on every value of at least one band are
+    candidates, and are near-duplicates if their estimated jaccard similarity
+    is at least the threshold. Each group of near-duplicates is represented by
+    the article that was indexed first. The scraper indexes the articles in the
+    order they were scraped, so the first-scraped article of a group stays its
+    representative, even if a later duplicate is newer or longer.
+    """
+
+    def __init__(self, bands=BANDS, threshold=THRESHOLD):
+        self.rows = NUM_PERM // bands
+        self.threshold = threshold
+        self.buckets = [defaultdict(list) for _ in range(bands)]
+        self.signatures = {}
+        self.representatives = {}
+
+    def _band_keys(self, signature):
+        for band, buckets in enumerate(self.buckets):
+            yield buckets, signature[band * self.rows : (band + 1) * self.rows].tobytes()
+
+    def find_duplicate(self, signature):
+        """Find the representative of the most similar near-duplicate article.
+
+        :param signature: MinHash signature of an article
+        :type signature: numpy.ndarray
+        :return: slug of the representative article, None if there's no near-duplicate
+        :rtype: str
+        """
+        if signature is None:
+            return None
+        candidates = set()
+        for buckets, key in self._band_keys(signature):
+            candidates.update(buckets.get(key, []))
+        best_slug, best_similarity = None, self.threshold
+        for slug in candidates:
+            similarity = jaccard(signature, self.signatures[slug])
+            if similarity >= best_similarity:
+                best_slug, best_similarity = slug, similarity
+        if best_slug is None:
+            return None
+        return self.representatives[best_slug]
+
+    def insert(self, slug, signature, duplicate_of=None):
+        """Add an article to the index.
+
+        :param slug: article slug
+        :type slug: str
+        :param signature: MinHash signature of the article
+        :type signature: numpy.ndarray
+        :param duplicate_of: slug of the article's representative, if it's a near-duplicate
+        :type duplicate_of: str
+        """
+        if signature is None:
+            return
+        self.signatures[slug] = signature
+        self.representatives[slug] = duplicate_of or slug
+        for buckets, key in self._band_keys(signature):
+            buckets[key].append(slug)
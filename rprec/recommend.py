@@ -1,12 +1,16 @@
+import json
 import logging
-import numpy as np
+import os
 import pandas as pd
+import shutil
 import spacy
+import tempfile
 
-from gensim.models.doc2vec import Doc2Vec, TaggedDocument
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics import pairwise_distances
+from collections import defaultdict
+from functools import lru_cache
 
+from rprec.artifacts import LABELS_FILE
+from rprec.backends import BACKENDS, merge_neighbors, run_backends
 from rprec.db import (
     db_connection,
     query_articles,
@@ -30,23 +34,54 @@ def process_articles(all_articles):
     return processed_texts, df["slug"].tolist()
 
 
-def spacy_tokenizer(raw_texts):
+def env_flag(name):
+    """Read a boolean environment variable, e.g. RPREC_OFFLINE=1 or RPREC_OFFLINE=false
+
+    :param name: the environment variable
+    :type name: str
+    :rtype: bool
     """
-    tokenize the text with spacy and remove stopwords
-    :param raw_texts: List of texts
-    :return:
+    return os.getenv(name, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+@lru_cache(maxsize=None)
+def load_spacy():
+    """Load the spacy pipeline once per process, without the unused pipes.
+
+    The model is downloaded if it is missing, unless the RPREC_OFFLINE
+    environment variable is true.
+
+    :return: the spacy pipeline
+    :rtype: spacy.language.Language
     """
-    # use spacy to process the raw text into spcay documents
+    disable = ["tagger", "parser", "ner"]
     try:
-        nlp = spacy.load("en_core_web_sm")
+        return spacy.load("en_core_web_sm", disable=disable)
     except OSError:
+        if env_flag("RPREC_OFFLINE"):
+            raise OSError(
+                "The spacy model en_core_web_sm is not installed and RPREC_OFFLINE "
+                "is set, install it with: python -m spacy download en_core_web_sm"
+            )
         from spacy.cli import download
 
-        download("en")
-        nlp = spacy.load("en_core_web_sm")
+        download("en_core_web_sm")
+        return spacy.load("en_core_web_sm", disable=disable)
+
+
+def spacy_tokenizer(raw_texts, nlp=None):
+    """
+    tokenize the text with spacy and remove stopwords
+    :param raw_texts: List of texts
+    :param nlp: a spacy pipeline, defaults to the one from load_spacy
+    :return:
+    """
+    # use spacy to process the raw text into spcay documents
+    if nlp is None:
+        nlp = load_spacy()
 
     texts = []
-    for doc in nlp.pipe(raw_texts, disable=["tagger", "parser", "ner"]):
+    for doc in nlp.pipe(raw_texts):
         texts.append(
             [preprocess_token(token) for token in doc if is_token_allowed(token)]
         )
@@ -69,35 +104,25 @@ def preprocess_token(token):
     return token.lemma_.strip().lower()
 
 
-def identity_tokenizer(text):
-    """dummy tokenizer for TfidfVectorizer"""
-    return text
-
+def collapse_duplicates(results, duplicate_of):
+    """Give near-duplicate articles the similar articles of the article they duplicate.
 
-def article_cosine_similarity(processed_texts):
-    """Return pairwise similarity of document vectors by performing tfidf on article tokens.
-
-    :param processed_texts: list of article tokens
-    :type processed_texts: list
-    :return: pariwise cosine similarity values for each article
+    :param results: rows of (slug, similar slug, scores...) from merge_neighbors
+    :type results: list
+    :param duplicate_of: near-duplicate slugs mapped to the slug they duplicate
+    :type duplicate_of: dict
+    :return: rows for the near-duplicate articles
+    :rtype: list
     """
-    tfidf = TfidfVectorizer(
-        tokenizer=identity_tokenizer,
-        lowercase=False,
-        ngram_range=(1, 1),
-        min_df=0.025,
-        max_df=0.5,
-    )
-    vectors = tfidf.fit_transform(processed_texts)
-    # convert to similarity using 1 minus distance
-    return 1 - pairwise_distances(vectors, vectors, metric="cosine")
-
-
-def tagged_docs_to_vectors(model, tagged_docs):
-    """Make vectors suitable for downstream ML tasks"""
-    sents = tagged_docs
-    regressors = [model.infer_vector(document.words, epochs=10) for document in sents]
-    return np.array(regressors)
+    results_by_slug = defaultdict(list)
+    for row in results:
+        results_by_slug[row[0]].append(row)
+    return [
+        (slug, *row[1:])
+        for slug, representative in duplicate_of.items()
+        for row in results_by_slug[representative]
+        if row[1] != slug
+    ]
 
 
 def run_recommender(
@@ -108,6 +133,9 @@ def run_recommender(
     database_port,
     database_url,
     top_five=True,
+    save_models=True,
+    parallel=True,
+    duplicates="collapse",
 ):
     """processes Real Python article text, computes cosine similarity and writes top 3 scores to the database.
 
@@ -125,7 +153,17 @@ def run_recommender(
     :type database_url: str
     :param top_five: If True, only record the top five most similar articles frr each scoring type.
     :type top_five: bool
+    :param save_models: If True, store the fitted models in the database for the real-time text endpoint.
+    :type save_models: bool
+    :param parallel: If True, run each similarity method in its own process.
+    :type parallel: bool
+    :param duplicates: How to handle articles the scraper flagged as near-duplicates. "keep" scores them
+        like any other article, "exclude" leaves them out and "collapse" leaves them out of the scoring
+        but gives them the similar articles of the article they duplicate.
+    :type duplicates: str
     """
+    if duplicates not in ("keep", "exclude", "collapse"):
+        raise ValueError(f"duplicates must be keep, exclude or collapse, not {duplicates}")
     # first connection reads
     connection = db_connection(
         database_name,
@@ -135,69 +173,61 @@ def run_recommender(
         database_port,
         database_url,
     )
-    all_articles = query_articles(connection)
+    duplicate_of = {}
+    if duplicates == "keep":
+        all_articles = query_articles(connection)
+    else:
+        all_articles = []
+        for slug, text, representative in query_articles(
+            connection, with_duplicate_of=True
+        ):
+            if representative is None:
+                all_articles.append((slug, text))
+            else:
+                duplicate_of[slug] = representative
+        logger.info(f"Leaving out {len(duplicate_of)} near-duplicate articles")
     processed_texts, labels = process_articles(all_articles)
-    cosine_similarities = article_cosine_similarity(processed_texts)
-    # doc2vec
-    tagged_docs = [
-        TaggedDocument(doc, [label]) for doc, label in zip(processed_texts, labels)
-    ]
-    model = Doc2Vec(vector_size=100, min_count=2, epochs=50)
-    model.build_vocab(tagged_docs)
-    logger.info("Training doc2vec model...")
-    model.train(tagged_docs, total_examples=model.corpus_count, epochs=model.epochs)
-    doc_vectors = tagged_docs_to_vectors(model, tagged_docs)
-
-    # second connection for write
-    connection = db_connection(
-        database_name,
-        database_user,
-        database_password,
-        database_server,
-        database_port,
-        database_url,
-    )
-    results = []
-    for i in range(len(processed_texts)):
-        if i % 10 == 0:
-            logger.info(f"Finished recording {i} articles")
-        slug = labels[i]
-        if top_five:
-            top_5_indices = cosine_similarities[i].argsort()[:-7:-1][1:]
-            similar_slugs = [labels[i] for i in top_5_indices]
-            cosine_scores = [cosine_similarities[i][j] for j in top_5_indices]
-            d2v_similar_results = model.docvecs.most_similar(
-                [doc_vectors[i, :]], topn=6
-            )[1:]
-            d2v_similar_slugs, d2v_scores = zip(*d2v_similar_results)
-        else:
-            similar_slugs = labels
-            cosine_scores = cosine_similarities[i]
-            d2v_similar_results = model.docvecs.most_similar(
-                [doc_vectors[i, :]], topn=len(processed_texts)
-            )
-            d2v_similar_slugs, d2v_scores = zip(*d2v_similar_results)
-
-        cosinedf = pd.DataFrame(
-            {
-                "slug": [slug] * len(similar_slugs),
-                "similar_slug": similar_slugs,
-                "cosine_scores": cosine_scores,
-            }
+    # the models are written to a temporary directory and stored in the
+    # database with the similarities, the api dynos don't share a filesystem
+    model_dir = tempfile.mkdtemp(prefix="rprec-models-") if save_models else None
+    try:
+        # the top result is the article itself
+        k = 6 if top_five else len(labels)
+        logger.info(f"Scoring {len(labels)} articles with {len(BACKENDS)} methods...")
+        neighbors = run_backends(
+            BACKENDS,
+            processed_texts,
+            labels,
+            k,
+            model_dir=model_dir,
+            parallel=parallel,
         )
-        d2vdf = pd.DataFrame(
-            {
-                "slug": [slug] * len(similar_slugs),
-                "similar_slug": d2v_similar_slugs,
-                "d2v_scores": d2v_scores,
-            }
+        if top_five:
+            neighbors = [
+                (indices[:, 1:], scores[:, 1:]) for indices, scores in neighbors
+            ]
+        results = merge_neighbors(labels, neighbors)
+        if duplicates == "collapse":
+            results.extend(collapse_duplicates(results, duplicate_of))
+        if model_dir is not None:
+            with open(os.path.join(model_dir, LABELS_FILE), "w") as f:
+                json.dump(labels, f)
+
+        # second connection for write
+        connection = db_connection(
+            database_name,
+            database_user,
+            database_password,
+            database_server,
+            database_port,
+            database_url,
         )
-
-        results.extend(
-            cosinedf.merge(d2vdf, on=["slug", "similar_slug"], how="outer")
-            .fillna(-1.0)
-            .to_numpy()
-            .tolist()
+        write_similarities_to_database(
+            results,
+            connection,
+            columns=[backend.column for backend in BACKENDS],
+            model_dir=model_dir,
         )
-
-    write_similarities_to_database(results, connection)
+    finally:
+        if model_dir is not None:
+            shutil.rmtree(model_dir, ignore_errors=True)
@@ -5,7 +5,19 @@ import time
 
 from bs4 import BeautifulSoup
 
-from rprec.db import db_connection, query_database_slugs, write_article_to_database
+from rprec.db import (
+    db_connection,
+    query_article_signatures,
+    query_database_slugs,
+    write_article_signatures,
+    write_article_to_database,
+)
+from rprec.dedup import (
+    LSHIndex,
+    minhash,
+    signature_from_bytes,
+    signature_to_bytes,
+)
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level="INFO")
@@ -60,6 +72,34 @@ def scrape_article(slug):
     return slug, author, article_text
 
 
+def build_near_duplicate_index(connection):
+    """Index the signatures of the articles in the database for near-duplicate lookups.
+
+    Articles scraped before near-duplicate detection get their signature
+    computed and recorded here.
+
+    :param connection: psycopg2 connection object
+    :type connection: psycopg2 connection object
+    :return: the index and a list of (slug, signature, duplicate_of) that still need recording
+    :rtype: tuple
+    """
+    index = LSHIndex()
+    missing_signatures = []
+    for slug, text, signature_bytes, duplicate_of in query_article_signatures(
+        connection
+    ):
+        if signature_bytes is None:
+            signature = minhash(text or "")
+            duplicate_of = index.find_duplicate(signature)
+            missing_signatures.append(
+                (slug, signature_to_bytes(signature), duplicate_of)
+            )
+        else:
+            signature = signature_from_bytes(signature_bytes)
+        index.insert(slug, signature, duplicate_of)
+    return index, missing_signatures
+
+
 def run_scraper(
     database_name,
     database_user,
@@ -115,6 +155,25 @@ def run_scraper(
     database_slugs = query_database_slugs(connection)
     # slugs = scrape_category_pages_for_slugs(categories, database_slugs)
 
+    connection = db_connection(
+        database_name,
+        database_user,
+        database_password,
+        database_server,
+        database_port,
+        database_url,
+    )
+    index, missing_signatures = build_near_duplicate_index(connection)
+    if missing_signatures:
+        connection = db_connection(
+            database_name,
+            database_user,
+            database_password,
+            database_server,
+            database_port,
+            database_url,
+        )
+        write_article_signatures(missing_signatures, connection)
 
     # iterate the new RP articles and write them to db
     for url in urls_to_read:
@@ -122,7 +181,19 @@ def run_scraper(
         slug = m.group(1)
         if slug in database_slugs:
             continue
-        article_object = scrape_article(slug)
+        slug, author, article_text = scrape_article(slug)
+        signature = minhash(article_text)
+        duplicate_of = index.find_duplicate(signature)
+        if duplicate_of is not None:
+            logger.info(f"{slug} is a near-duplicate of {duplicate_of}")
+        index.insert(slug, signature, duplicate_of)
+        article_object = (
+            slug,
+            author,
+            article_text,
+            signature_to_bytes(signature),
+            duplicate_of,
+        )
         # I close the connection object after each write
         connection = db_connection(
             database_name,
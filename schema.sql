@@ -51,7 +51,9 @@ CREATE TABLE articles (
     slug character varying(200) NOT NULL,
     author character varying(50) NOT NULL,
     text text,
-    id integer NOT NULL
+    id integer NOT NULL,
+    minhash bytea,
+    duplicate_of character varying(200)
 );
 
 
@@ -116,6 +118,54 @@ ALTER TABLE similar_articles_id_seq OWNER TO postgres;
 ALTER SEQUENCE similar_articles_id_seq OWNED BY similar_articles.id;
 
 
+--
+-- Name: similarity_generations; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE similarity_generations (
+    id integer NOT NULL,
+    created_at timestamp with time zone DEFAULT now() NOT NULL,
+    similarity_count integer NOT NULL
+);
+
+
+ALTER TABLE similarity_generations OWNER TO postgres;
+
+--
+-- Name: similarity_generations_id_seq; Type: SEQUENCE; Schema: public; Owner: postgres
+--
+
+CREATE SEQUENCE similarity_generations_id_seq
+    AS integer
+    START WITH 1
+    INCREMENT BY 1
+    NO MINVALUE
+    NO MAXVALUE
+    CACHE 1;
+
+
+ALTER TABLE similarity_generations_id_seq OWNER TO postgres;
+
+--
+-- Name: similarity_generations_id_seq; Type: SEQUENCE OWNED BY; Schema: public; Owner: postgres
+--
+
+ALTER SEQUENCE similarity_generations_id_seq OWNED BY similarity_generations.id;
+
+
+--
+-- Name: model_files; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE model_files (
+    generation_id integer NOT NULL,
+    name character varying(200) NOT NULL,
+    data bytea NOT NULL
+);
+
+
+ALTER TABLE model_files OWNER TO postgres;
+
 --
 -- Name: articles id; Type: DEFAULT; Schema: public; Owner: postgres
 --
@@ -130,6 +180,13 @@ ALTER TABLE ONLY articles ALTER COLUMN id SET DEFAULT nextval('articles_id_seq':
 ALTER TABLE ONLY similar_articles ALTER COLUMN id SET DEFAULT nextval('similar_articles_id_seq'::regclass);
 
 
+--
+-- Name: similarity_generations id; Type: DEFAULT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY similarity_generations ALTER COLUMN id SET DEFAULT nextval('similarity_generations_id_seq'::regclass);
+
+
 --
 -- Name: articles articles_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
 --
@@ -146,6 +203,22 @@ ALTER TABLE ONLY similar_articles
     ADD CONSTRAINT similar_articles_pkey PRIMARY KEY (id);
 
 
+--
+-- Name: similarity_generations similarity_generations_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY similarity_generations
+    ADD CONSTRAINT similarity_generations_pkey PRIMARY KEY (id);
+
+
+--
+-- Name: model_files model_files_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY model_files
+    ADD CONSTRAINT model_files_pkey PRIMARY KEY (generation_id, name);
+
+
 --
 -- Name: articles unique_slug; Type: CONSTRAINT; Schema: public; Owner: postgres
 --
@@ -154,6 +227,20 @@ ALTER TABLE ONLY articles
     ADD CONSTRAINT unique_slug UNIQUE (slug);
 
 
+--
+-- Name: similar_articles_slug_cosine_idx; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX similar_articles_slug_cosine_idx ON similar_articles USING btree (slug, cosine_similarity DESC) INCLUDE (similar_slug, doc2vec_similarity, id);
+
+
+--
+-- Name: similar_articles_slug_doc2vec_idx; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX similar_articles_slug_doc2vec_idx ON similar_articles USING btree (slug, doc2vec_similarity DESC) INCLUDE (similar_slug, cosine_similarity, id);
+
+
 --
 -- Name: similar_articles similar_articles_slug_fkey; Type: FK CONSTRAINT; Schema: public; Owner: postgres
 --
@@ -170,6 +257,14 @@ ALTER TABLE ONLY similar_articles
     ADD CONSTRAINT similar_slug_constraint FOREIGN KEY (similar_slug) REFERENCES articles(slug);
 
 
+--
+-- Name: model_files model_files_generation_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY model_files
+    ADD CONSTRAINT model_files_generation_id_fkey FOREIGN KEY (generation_id) REFERENCES similarity_generations(id) ON DELETE CASCADE;
+
+
 --
 -- PostgreSQL database dump complete
 --
@@ -0,0 +1,61 @@
+import os
+import tempfile
+
+import pytest
+
+# tests that need postgres run against this database and wipe it, so it's a
+# separate variable from DATABASE_URL, e.g.
+# RPREC_TEST_DATABASE_URL=postgresql://postgres@localhost/rprec_test pytest
+TEST_DATABASE_URL = os.getenv("RPREC_TEST_DATABASE_URL")
+# rprec.app reads these when it's imported, never point it at a real database
+os.environ["DATABASE_URL"] = TEST_DATABASE_URL or "postgresql://localhost/rprec_test"
+os.environ["RPREC_MODEL_DIR"] = tempfile.mkdtemp(prefix="rprec-models-")
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), os.pardir, "schema.sql")
+
+
+@pytest.fixture
+def database_url():
+    """A postgres database freshly loaded with schema.sql, skips if there's none"""
+    psycopg2 = pytest.importorskip("psycopg2")
+    if TEST_DATABASE_URL is None:
+        pytest.skip("RPREC_TEST_DATABASE_URL is not set")
+    try:
+        connection = psycopg2.connect(TEST_DATABASE_URL)
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"postgres is not reachable: {e}")
+    connection.autocommit = True
+    with connection.cursor() as cursor:
+        cursor.execute("DROP SCHEMA IF EXISTS rprec_schema CASCADE;")
+        cursor.execute("DROP SCHEMA public CASCADE;")
+        cursor.execute("CREATE SCHEMA public;")
+        with open(SCHEMA_PATH) as f:
+            cursor.execute(f.read())
+    connection.close()
+    return TEST_DATABASE_URL
+
+
+def insert_articles(database_url, slugs):
+    """Insert placeholder articles so similar_articles rows can reference them"""
+    import psycopg2
+
+    from psycopg2.extras import execute_values
+
+    connection = psycopg2.connect(database_url)
+    with connection.cursor() as cursor:
+        execute_values(
+            cursor,
+            "INSERT INTO articles (slug, author, text) VALUES %s;",
+            [(slug, "Real Python", f"text of {slug}") for slug in slugs],
+        )
+    connection.commit()
+    connection.close()
+
+
+def similarity_rows(slugs, n_similar=5):
+    """Rows of (slug, similar slug, cosine, doc2vec) linking each slug to the next ones"""
+    return [
+        (slug, slugs[(i + j) % len(slugs)], 1.0 / j, 1.0 / (j + 1))
+        for i, slug in enumerate(slugs)
+        for j in range(1, n_similar + 1)
+    ]
@@ -0,0 +1,39 @@
+import os
+
+from rprec.artifacts import (
+    GENERATIONS_DIR,
+    current_generation,
+    new_generation,
+    publish_generation,
+)
+
+
+def publish(model_dir, generation):
+    generation_dir = new_generation(model_dir, generation)
+    with open(os.path.join(generation_dir, "labels.json"), "w") as f:
+        f.write("[]")
+    publish_generation(model_dir, generation_dir, generation)
+
+
+def test_publishing_keeps_the_previous_generation_and_downloads_in_progress(tmp_path):
+    model_dir = str(tmp_path)
+    publish(model_dir, 1)
+    publish(model_dir, 2)
+    # another generation still downloading, its name sorts after the others
+    new_generation(model_dir, 9)
+    publish(model_dir, 3)
+
+    assert current_generation(model_dir) == 3
+    assert sorted(os.listdir(os.path.join(model_dir, GENERATIONS_DIR))) == [
+        "0000000002",
+        "0000000003",
+        "0000000009.partial",
+    ]
+
+
+def test_a_corrupt_current_file_is_replaced_by_the_next_download(tmp_path):
+    model_dir = str(tmp_path)
+    (tmp_path / "CURRENT").write_text("")
+    assert current_generation(model_dir) is None
+    publish(model_dir, 1)
+    assert current_generation(model_dir) == 1
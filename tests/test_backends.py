@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("sklearn")
+pytest.importorskip("gensim")
+
+from rprec.backends import merge_neighbors, top_k  # noqa: E402
+
+
+def test_top_k_returns_the_best_columns_best_first():
+    similarities = np.array(
+        [
+            [1.0, 0.2, 0.9, 0.5],
+            [0.3, 1.0, 0.1, 0.7],
+        ]
+    )
+    indices, scores = top_k(similarities, 3)
+    np.testing.assert_array_equal(indices, [[0, 2, 3], [1, 3, 0]])
+    np.testing.assert_array_equal(scores, [[1.0, 0.9, 0.5], [1.0, 0.7, 0.3]])
+
+
+def test_top_k_is_capped_at_the_number_of_articles():
+    indices, scores = top_k(np.array([[0.1, 0.4], [0.6, 0.2]]), 5)
+    np.testing.assert_array_equal(indices, [[1, 0], [0, 1]])
+    assert scores.shape == (2, 2)
+
+
+def test_merge_neighbors_fills_pairs_one_backend_missed():
+    labels = ["a", "b", "c"]
+    cosine = (np.array([[1], [2], [0]]), np.array([[0.9], [0.8], [0.7]]))
+    doc2vec = (np.array([[1], [0], [0]]), np.array([[0.6], [0.5], [0.4]]))
+    rows = merge_neighbors(labels, [cosine, doc2vec])
+    assert sorted(rows) == [
+        ("a", "b", 0.9, 0.6),
+        ("b", "a", -1.0, 0.5),
+        ("b", "c", 0.8, -1.0),
+        ("c", "a", 0.7, 0.4),
+    ]
+
+
+def test_merge_neighbors_with_one_backend():
+    rows = merge_neighbors(["a", "b"], [(np.array([[1], [0]]), np.array([[0.3], [0.2]]))])
+    assert sorted(rows) == [("a", "b", 0.3), ("b", "a", 0.2)]
+
+
+@pytest.mark.filterwarnings("error:Call to deprecated")
+def test_doc2vec_backend_avoids_deprecated_gensim_apis(tmp_path):
+    from rprec.backends import Doc2VecBackend
+
+    words = [f"word{i}" for i in range(50)]
+    texts = [words[i * 10 : i * 10 + 20] * 3 for i in range(4)]
+    labels = ["a", "b", "c", "d"]
+    indices, scores = Doc2VecBackend().neighbors(texts, labels, 2, str(tmp_path))
+    assert indices.shape == scores.shape == (4, 2)
+    assert (scores[:, 0] >= scores[:, 1]).all()
@@ -0,0 +1,61 @@
+import numpy as np
+
+from rprec.dedup import (
+    EMPTY_SIGNATURE,
+    NUM_PERM,
+    minhash,
+    signature_from_bytes,
+    signature_to_bytes,
+)
+
+
+def test_short_articles_get_the_empty_signature():
+    assert minhash("too short") is None
+    assert signature_to_bytes(None) == EMPTY_SIGNATURE
+    assert signature_from_bytes(EMPTY_SIGNATURE) is None
+    assert signature_from_bytes(memoryview(EMPTY_SIGNATURE)) is None
+
+
+def test_signatures_round_trip():
+    signature = minhash("one two three four five six seven")
+    assert signature.shape == (NUM_PERM,)
+    data = signature_to_bytes(signature)
+    np.testing.assert_array_equal(signature_from_bytes(memoryview(data)), signature)
+
+
+WORDS = [f"word{i}" for i in range(200)]
+
+
+def text(words):
+    return " ".join(words)
+
+
+def test_near_duplicates_share_the_first_indexed_representative():
+    from rprec.dedup import LSHIndex
+
+    index = LSHIndex()
+    original = minhash(text(WORDS))
+    index.insert("original", original)
+    # one changed word in 200 keeps the jaccard similarity well above 0.8
+    lesson = minhash(text(WORDS[:-1] + ["changed"]))
+    assert index.find_duplicate(lesson) == "original"
+    index.insert("lesson", lesson, "original")
+    # a duplicate of the duplicate still points at the first article
+    assert index.find_duplicate(lesson) == "original"
+
+
+def test_different_articles_are_not_duplicates():
+    from rprec.dedup import LSHIndex
+
+    index = LSHIndex()
+    index.insert("first", minhash(text(WORDS)))
+    assert index.find_duplicate(minhash(text(WORDS[::-1]))) is None
+    assert index.find_duplicate(None) is None
+
+
+def test_similar_texts_have_similar_signatures():
+    from rprec.dedup import jaccard
+
+    signature = minhash(text(WORDS))
+    assert jaccard(signature, minhash(text(WORDS))) == 1.0
+    assert jaccard(signature, minhash(text(WORDS[:100]))) < 0.8
@@ -0,0 +1,24 @@
+import pytest
+
+pytest.importorskip("fastapi")
+
+from rprec.app.main import etag_matches  # noqa: E402
+
+
+@pytest.mark.parametrize(
+    "if_none_match, expected",
+    [
+        (None, False),
+        ('"1-a"', True),
+        ('W/"1-a"', True),
+        ('"0-a", "1-a"', True),
+        ('"0-a",W/"1-a"', True),
+        ("*", True),
+        ('"2-a"', False),
+        ('"1-ab"', False),
+        ("1-a", False),
+        ("", False),
+    ],
+)
+def test_if_none_match_uses_the_weak_comparison(if_none_match, expected):
+    assert etag_matches(if_none_match, '"1-a"') is expected
@@ -0,0 +1,204 @@
+import select
+import time
+
+import psycopg2
+import pytest
+
+from conftest import insert_articles, similarity_rows
+from rprec.db import GENERATION_CHANNEL, write_similarities_to_database
+
+SLUGS = ["a", "b", "c", "d"]
+
+
+def listen(database_url):
+    connection = psycopg2.connect(database_url)
+    connection.autocommit = True
+    with connection.cursor() as cursor:
+        cursor.execute(f"LISTEN {GENERATION_CHANNEL};")
+    return connection
+
+
+def notifications(connection, timeout=1.0):
+    """The payloads notified to a listening connection within timeout seconds"""
+    select.select([connection], [], [], timeout)
+    connection.poll()
+    payloads = [notify.payload for notify in connection.notifies]
+    connection.notifies.clear()
+    return payloads
+
+
+def generations(database_url):
+    connection = psycopg2.connect(database_url)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT id, similarity_count FROM similarity_generations ORDER BY id;")
+        rows = cursor.fetchall()
+    connection.close()
+    return rows
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            pytest.fail("timed out")
+        time.sleep(0.05)
+
+
+def test_a_write_records_and_notifies_a_generation(database_url):
+    insert_articles(database_url, SLUGS)
+    listener = listen(database_url)
+    rows = similarity_rows(SLUGS, n_similar=2)
+    write_similarities_to_database(rows, psycopg2.connect(database_url))
+
+    [(generation, count)] = generations(database_url)
+    assert count == len(rows)
+    assert notifications(listener) == [str(generation)]
+    listener.close()
+
+
+def test_a_failed_write_records_and_notifies_nothing(database_url):
+    insert_articles(database_url, SLUGS)
+    listener = listen(database_url)
+    # the unknown slug violates the foreign key, the transaction is rolled back
+    write_similarities_to_database(
+        [("a", "unknown", 0.5, 0.5)], psycopg2.connect(database_url)
+    )
+
+    assert generations(database_url) == []
+    assert notifications(listener) == []
+    listener.close()
+
+
+def test_listener_catches_up_after_reconnecting(database_url, monkeypatch):
+    from rprec.app import generations as listeners
+
+    monkeypatch.setattr(listeners, "POLL_TIMEOUT", 0.1)
+    monkeypatch.setattr(listeners, "RECONNECT_DELAY", 1.0)
+    insert_articles(database_url, SLUGS)
+    rows = similarity_rows(SLUGS, n_similar=2)
+    write_similarities_to_database(rows, psycopg2.connect(database_url))
+
+    listener = listeners.GenerationListener(database_url)
+    seen = []
+    listener.subscribe(seen.append)
+    listener.start()
+    try:
+        # recorded before the listener started
+        wait_for(lambda: seen == [1])
+        write_similarities_to_database(rows, psycopg2.connect(database_url))
+        wait_for(lambda: seen == [1, 2])
+
+        connection = psycopg2.connect(database_url)
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_terminate_backend(%s);",
+                (listener.connection.get_backend_pid(),),
+            )
+        connection.close()
+        wait_for(lambda: listener.connection is None)
+        # recorded while the listener is disconnected, nobody is notified
+        write_similarities_to_database(rows, psycopg2.connect(database_url))
+        wait_for(lambda: seen == [1, 2, 3])
+        assert listener.generation == 3
+    finally:
+        listener.stop()
+
+
+def test_similar_articles_are_tagged_with_their_generation(database_url):
+    pytest.importorskip("fastapi")
+    from fastapi.testclient import TestClient
+
+    from rprec.app.main import app, listener
+
+    insert_articles(database_url, SLUGS)
+    rows = similarity_rows(SLUGS, n_similar=2)
+    write_similarities_to_database(rows, psycopg2.connect(database_url))
+    with TestClient(app) as client:
+        wait_for(lambda: listener.generation == 1)
+        for method in ("cosine", "doc2vec"):
+            url = f"/articles/similar/{method}/a/"
+            response = client.get(url)
+            assert response.status_code == 200
+            etag = response.headers["etag"]
+            assert etag == '"1-a"'
+            assert response.headers["cache-control"] == "no-cache"
+
+            response = client.get(url, headers={"If-None-Match": etag})
+            assert response.status_code == 304
+            assert response.headers["etag"] == etag
+            assert response.content == b""
+
+            # as sent through a proxy that weakened the tag
+            response = client.get(url, headers={"If-None-Match": f'"0-a", W/{etag}'})
+            assert response.status_code == 304
+
+        # a new generation invalidates the cached responses
+        write_similarities_to_database(rows, psycopg2.connect(database_url))
+        wait_for(lambda: listener.generation == 2)
+        response = client.get("/articles/similar/cosine/a/", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] == '"2-a"'
+
+    # once the listener stopped, newer generations could go unnoticed
+    response = TestClient(app).get(
+        "/articles/similar/cosine/a/", headers={"If-None-Match": '"2-a"'}
+    )
+    assert response.status_code == 200
+    assert "etag" not in response.headers
+
+
+def test_listener_skips_malformed_notifications(database_url, monkeypatch):
+    from rprec.app import generations as listeners
+
+    monkeypatch.setattr(listeners, "POLL_TIMEOUT", 0.1)
+    insert_articles(database_url, SLUGS)
+    listener = listeners.GenerationListener(database_url)
+    listener.start()
+    try:
+        wait_for(listener.listening)
+        backend_pid = listener.connection.get_backend_pid()
+        connection = psycopg2.connect(database_url)
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(f"NOTIFY {GENERATION_CHANNEL}, 'x';")
+        connection.close()
+        write_similarities_to_database(
+            similarity_rows(SLUGS, n_similar=2), psycopg2.connect(database_url)
+        )
+        wait_for(lambda: listener.generation == 1)
+        # handled on the same connection, without reconnecting
+        assert listener.connection.get_backend_pid() == backend_pid
+    finally:
+        listener.stop()
+    assert not listener.listening()
+
+
+def test_listener_reconnects_after_unexpected_errors(database_url, monkeypatch):
+    from rprec.app import generations as listeners
+
+    monkeypatch.setattr(listeners, "POLL_TIMEOUT", 0.1)
+    monkeypatch.setattr(listeners, "RECONNECT_DELAY", 0.1)
+    listener = listeners.GenerationListener(database_url)
+    handle_notifies = listener._handle_notifies
+    failures = []
+
+    def fail_once():
+        if not failures:
+            failures.append(True)
+            raise RuntimeError("unexpected")
+        handle_notifies()
+
+    monkeypatch.setattr(listener, "_handle_notifies", fail_once)
+    insert_articles(database_url, SLUGS)
+    listener.start()
+    try:
+        wait_for(listener.listening)
+        write_similarities_to_database(
+            similarity_rows(SLUGS, n_similar=2), psycopg2.connect(database_url)
+        )
+        # the notification that failed is caught up on after reconnecting
+        wait_for(lambda: listener.generation == 1)
+        assert failures and listener.thread.is_alive()
+    finally:
+        listener.stop()
@@ -0,0 +1,45 @@
+import re
+
+import pytest
+
+from conftest import SCHEMA_PATH
+from rprec.db import SIMILARITY_INDEXES
+
+sqlalchemy = pytest.importorskip("sqlalchemy")
+
+# the parts of a CREATE INDEX statement that make up its definition
+CREATE_INDEX = re.compile(
+    r"CREATE INDEX (?:IF NOT EXISTS )?(?P<name>\w+)\s+ON (?:public\.)?(?P<table>\w+)"
+    r"(?: USING btree)?\s*\((?P<columns>[^)]*)\)\s*INCLUDE\s*\((?P<include>[^)]*)\)"
+)
+
+
+def definitions(statements):
+    """Parse CREATE INDEX statements of similar_articles into comparable tuples"""
+    parsed = set()
+    for statement in statements:
+        for match in CREATE_INDEX.finditer(statement):
+            columns, include = (
+                tuple(" ".join(column.split()) for column in match[part].split(","))
+                for part in ("columns", "include")
+            )
+            if match["table"] == "similar_articles":
+                parsed.add((match["name"], columns, include))
+    return parsed
+
+
+def test_the_similarity_indexes_are_defined_the_same_everywhere():
+    from sqlalchemy.dialects import postgresql
+    from sqlalchemy.schema import CreateIndex
+
+    from rprec.app.models import SimilarArticle
+
+    with open(SCHEMA_PATH) as f:
+        schema = definitions([f.read()])
+    recommender = definitions(SIMILARITY_INDEXES)
+    orm = definitions(
+        str(CreateIndex(index).compile(dialect=postgresql.dialect()))
+        for index in SimilarArticle.__table__.indexes
+    )
+    assert len(schema) == 2
+    assert schema == recommender == orm
@@ -0,0 +1,44 @@
+import psycopg2
+import pytest
+
+from conftest import insert_articles, similarity_rows
+from rprec.db import write_similarities_to_database
+
+sqlalchemy = pytest.importorskip("sqlalchemy")
+
+
+def explain(database_url, query):
+    from sqlalchemy.dialects import postgresql
+
+    sql = query.statement.compile(
+        dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+    )
+    connection = psycopg2.connect(database_url)
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN {sql}")
+        plan = "\n".join(row[0] for row in cursor.fetchall())
+    connection.close()
+    return plan
+
+
+@pytest.mark.parametrize(
+    "query_name, index",
+    [
+        ("cosine_query", "similar_articles_slug_cosine_idx"),
+        ("doc2vec_query", "similar_articles_slug_doc2vec_idx"),
+    ],
+)
+def test_similarity_lookups_are_index_only_scans(database_url, query_name, index):
+    from sqlalchemy.orm import Session
+
+    from rprec.app import queries
+
+    slugs = [f"article-{i}" for i in range(1000)]
+    insert_articles(database_url, slugs)
+    # creates the indexes and vacuums the table
+    write_similarities_to_database(
+        similarity_rows(slugs), psycopg2.connect(database_url)
+    )
+
+    query = getattr(queries, query_name)(Session(), slug="article-42", limit=3)
+    assert f"Index Only Scan using {index}" in explain(database_url, query)
@@ -0,0 +1,47 @@
+import pytest
+
+OLD_ARTICLES_TABLE = """CREATE TABLE articles (
+    id serial PRIMARY KEY,
+    slug character varying(200) NOT NULL UNIQUE,
+    author character varying(200) NOT NULL,
+    text text NOT NULL
+);"""
+
+
+def test_migrate_brings_an_old_database_up_to_date(database_url):
+    import psycopg2
+
+    from rprec.db import migrate
+
+    connection = psycopg2.connect(database_url)
+    connection.autocommit = True
+    with connection.cursor() as cursor:
+        cursor.execute("DROP SCHEMA public CASCADE; CREATE SCHEMA public;")
+        cursor.execute(OLD_ARTICLES_TABLE)
+    for _ in range(2):
+        migrate(psycopg2.connect(database_url))
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """SELECT column_name FROM information_schema.columns
+            WHERE table_name = 'articles' AND column_name IN ('minhash', 'duplicate_of')"""
+        )
+        assert sorted(row[0] for row in cursor.fetchall()) == ["duplicate_of", "minhash"]
+        cursor.execute("SELECT to_regclass('similarity_generations'), to_regclass('model_files');")
+        assert None not in cursor.fetchone()
+    connection.close()
+
+
+def test_a_failed_migration_raises(database_url):
+    import psycopg2
+
+    from rprec.db import migrate
+
+    connection = psycopg2.connect(database_url)
+    connection.autocommit = True
+    with connection.cursor() as cursor:
+        cursor.execute("DROP SCHEMA public CASCADE; CREATE SCHEMA public;")
+    connection.close()
+    # there's no articles table to migrate
+    with pytest.raises(psycopg2.Error):
+        migrate(psycopg2.connect(database_url))
@@ -0,0 +1,83 @@
+import os
+
+import psycopg2
+import pytest
+
+from conftest import insert_articles, similarity_rows
+from rprec.app.shared import sync
+from rprec.artifacts import GENERATIONS_DIR, current_generation, current_generation_dir
+from rprec.db import write_similarities_to_database
+
+
+def record_models(database_url, tmp_path, contents):
+    model_dir = tmp_path / "recommender"
+    model_dir.mkdir(exist_ok=True)
+    for name, data in contents.items():
+        (model_dir / name).write_bytes(data)
+    slugs = ["a", "b", "c"]
+    write_similarities_to_database(
+        similarity_rows(slugs, n_similar=2),
+        psycopg2.connect(database_url),
+        model_dir=str(model_dir),
+    )
+
+
+def test_api_downloads_the_models_the_recommender_recorded(database_url, tmp_path):
+    insert_articles(database_url, ["a", "b", "c"])
+    api_dir = str(tmp_path / "api")
+    assert sync(api_dir, database_url) is None
+
+    record_models(database_url, tmp_path, {"labels.json": b'["a"]', "x.npy": b"1"})
+    generation = sync(api_dir, database_url)
+    assert generation == current_generation(api_dir)
+    generation_dir = current_generation_dir(api_dir)
+    assert sorted(os.listdir(generation_dir)) == ["labels.json", "x.npy"]
+    # already current, nothing to download
+    assert sync(api_dir, database_url, generation) == generation
+
+    record_models(database_url, tmp_path, {"labels.json": b'["b"]'})
+    assert sync(api_dir, database_url) == generation + 1
+    with open(os.path.join(current_generation_dir(api_dir), "labels.json")) as f:
+        assert f.read() == '["b"]'
+
+
+def test_a_failed_download_leaves_no_partial_generation(
+    database_url, tmp_path, monkeypatch
+):
+    insert_articles(database_url, ["a", "b", "c"])
+    record_models(database_url, tmp_path, {"labels.json": b'["a"]'})
+
+    def publish_generation(model_dir, generation_dir, generation):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr("rprec.app.shared.publish_generation", publish_generation)
+    api_dir = tmp_path / "api"
+    with pytest.raises(OSError):
+        sync(str(api_dir), database_url)
+    assert os.listdir(api_dir / GENERATIONS_DIR) == []
+    assert current_generation(str(api_dir)) is None
+
+
+def test_similar_articles_stay_readable_while_the_models_upload(
+    database_url, tmp_path, monkeypatch
+):
+    import rprec.db
+
+    insert_articles(database_url, ["a", "b", "c"])
+    write_model_files = rprec.db.write_model_files
+    readable = []
+
+    def upload_and_read(cursor, generation, model_dir):
+        write_model_files(cursor, generation, model_dir)
+        # the api's lookups, while the recommender's transaction is still open
+        connection = psycopg2.connect(database_url)
+        with connection.cursor() as reader:
+            reader.execute("SET lock_timeout = '100ms';")
+            reader.execute("SELECT count(*) FROM similar_articles;")
+            readable.append(reader.fetchone()[0])
+        connection.close()
+
+    monkeypatch.setattr(rprec.db, "write_model_files", upload_and_read)
+    record_models(database_url, tmp_path, {"labels.json": b'["a"]'})
+    assert readable == [0]
+    assert sync(str(tmp_path / "api"), database_url) == 1
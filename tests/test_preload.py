@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import os
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+
+def test_a_failed_startup_preload_is_logged(monkeypatch, tmp_path, caplog):
+    from rprec.app import inference
+
+    def sync(model_dir, database_url, generation=None):
+        raise RuntimeError("database is down")
+
+    monkeypatch.setattr("rprec.app.shared.sync", sync)
+    batcher = inference.MicroBatcher(str(tmp_path), "postgresql://localhost/none")
+
+    async def start():
+        await batcher.start()
+        await batcher.stop()
+
+    with caplog.at_level(logging.ERROR, logger=inference.__name__):
+        asyncio.run(start())
+        # joins the preload thread, its done callbacks have run once it returns
+        batcher.preloader.shutdown(wait=True)
+    assert "preloading the models failed" in caplog.text
+    assert "database is down" in caplog.text
+
+
+def test_loading_retries_once_when_the_generation_was_pruned(monkeypatch, tmp_path):
+    from rprec.app import inference
+    from rprec.artifacts import current_generation_dir
+
+    from test_artifacts import publish
+
+    model_dir = str(tmp_path)
+    publish(model_dir, 1)
+    loaded = []
+
+    def load_models(generation_dir):
+        loaded.append(generation_dir)
+        if len(loaded) == 1:
+            # a newer generation is published and this one pruned mid-load
+            publish(model_dir, 2)
+            publish(model_dir, 3)
+            raise FileNotFoundError(generation_dir)
+        return generation_dir
+
+    monkeypatch.setattr(inference, "load_models", load_models)
+    assert inference.load_current_models(model_dir) == current_generation_dir(model_dir)
+    assert [os.path.basename(path) for path in loaded] == ["0000000001", "0000000003"]
+
+
+def test_preload_returns_without_waiting_for_the_download(monkeypatch, tmp_path):
+    import threading
+
+    from rprec.app import inference
+
+    downloading = threading.Event()
+    release = threading.Event()
+
+    def sync(model_dir, database_url, generation=None):
+        downloading.set()
+        release.wait(5)
+
+    monkeypatch.setattr("rprec.app.shared.sync", sync)
+    batcher = inference.MicroBatcher(str(tmp_path), "postgresql://localhost/none")
+    # the generation listener calls this from its thread, it must not block it
+    future = batcher.preload(2)
+    assert downloading.wait(5)
+    assert not future.done()
+    release.set()
+    assert future.result(5) is None
+    batcher.preloader.shutdown(wait=True)
+
+
+def test_concurrent_loads_of_a_generation_load_it_once(monkeypatch, tmp_path):
+    import threading
+    import time
+
+    from functools import lru_cache
+
+    from rprec.app import inference
+
+    from test_artifacts import publish
+
+    model_dir = str(tmp_path)
+    publish(model_dir, 1)
+    loads = []
+
+    @lru_cache(maxsize=1)
+    def load_models(generation_dir):
+        loads.append(generation_dir)
+        time.sleep(0.05)
+        return generation_dir
+
+    monkeypatch.setattr(inference, "load_models", load_models)
+    threads = [
+        threading.Thread(target=inference.load_current_models, args=(model_dir,))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1
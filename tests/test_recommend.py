@@ -0,0 +1,22 @@
+import pytest
+
+pytest.importorskip("spacy")
+pytest.importorskip("pandas")
+
+from rprec.recommend import collapse_duplicates  # noqa: E402
+
+
+def test_duplicates_get_the_similar_articles_of_their_representative():
+    results = [
+        ("a", "b", 0.9, 0.8),
+        ("a", "lesson", 0.7, 0.6),
+        ("a", "c", 0.5, -1.0),
+        ("b", "a", 0.9, 0.8),
+    ]
+    rows = collapse_duplicates(results, {"lesson": "a"})
+    # the duplicate isn't similar to itself
+    assert rows == [("lesson", "b", 0.9, 0.8), ("lesson", "c", 0.5, -1.0)]
+
+
+def test_duplicates_of_an_unscored_article_get_nothing():
+    assert collapse_duplicates([("a", "b", 0.9)], {"lesson": "gone"}) == []
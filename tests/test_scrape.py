@@ -0,0 +1,20 @@
+import psycopg2
+import pytest
+
+from conftest import insert_articles
+from rprec.db import write_article_signatures
+
+pytest.importorskip("bs4")
+
+
+def test_short_articles_are_only_signed_once(database_url):
+    from rprec.scrape import build_near_duplicate_index
+
+    insert_articles(database_url, ["short"])
+    index, missing = build_near_duplicate_index(psycopg2.connect(database_url))
+    assert missing == [("short", b"", None)]
+    write_article_signatures(missing, psycopg2.connect(database_url))
+
+    index, missing = build_near_duplicate_index(psycopg2.connect(database_url))
+    assert missing == []
+    assert index.signatures == {}
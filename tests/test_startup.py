@@ -0,0 +1,74 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+# modules the api must only import once a text query needs the models
+HEAVY_MODULES = ("sklearn", "gensim", "spacy", "pandas")
+STARTUP_TARGET = float(os.getenv("RPREC_STARTUP_TARGET", "3.0"))
+
+IMPORT_API = f"""
+import json, sys, time
+started = time.perf_counter()
+import rprec.app.main
+elapsed = time.perf_counter() - started
+heavy = [m for m in {HEAVY_MODULES!r} if m in sys.modules]
+print(json.dumps({{"elapsed": elapsed, "heavy": heavy}}))
+"""
+
+
+@pytest.fixture(scope="module")
+def api_import():
+    """Import the api in a fresh interpreter, like a cold start"""
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_API],
+        cwd=os.path.join(os.path.dirname(__file__), os.pardir),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def test_api_import_skips_the_ml_stack(api_import):
+    assert api_import["heavy"] == []
+
+
+def test_api_import_is_within_the_startup_target(api_import):
+    assert api_import["elapsed"] < STARTUP_TARGET
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [("1", True), ("true", True), ("Yes", True), ("0", False), ("false", False), ("", False)],
+)
+def test_offline_flag(monkeypatch, value, expected):
+    pytest.importorskip("spacy")
+    from rprec.recommend import env_flag
+
+    monkeypatch.setenv("RPREC_OFFLINE", value)
+    assert env_flag("RPREC_OFFLINE") is expected
+
+
+@pytest.mark.parametrize("database_url", [None, "postgresql://localhost:1/unreachable"])
+def test_the_model_download_never_stops_the_api_from_starting(tmp_path, database_url):
+    # the model directory can't be created, like a full or read-only disk
+    model_dir = tmp_path / "models"
+    model_dir.write_text("not a directory")
+    env = dict(os.environ, RPREC_MODEL_DIR=str(model_dir))
+    env.pop("DATABASE_URL")
+    if database_url is not None:
+        env["DATABASE_URL"] = database_url
+    result = subprocess.run(
+        [sys.executable, "-m", "rprec.app.shared"],
+        cwd=os.path.join(os.path.dirname(__file__), os.pardir),
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+    assert "could not download the models" in result.stderr
@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+
+from scipy.sparse import csr_matrix
+
+pytest.importorskip("spacy")
+pytest.importorskip("fastapi")
+
+
+class FakeTfidf:
+    """Maps every text to the same vector"""
+
+    def __init__(self, vector):
+        self.vector = vector
+
+    def transform(self, processed_texts):
+        return csr_matrix(np.tile(self.vector, (len(processed_texts), 1)))
+
+
+class FakeDocvecs:
+    def __init__(self, scores):
+        self.scores = scores
+
+    def most_similar(self, vectors, topn):
+        return self.scores[:topn]
+
+
+class FakeDoc2Vec:
+    def __init__(self, scores):
+        self.dv = FakeDocvecs(scores)
+
+    def infer_vector(self, tokens, epochs):
+        return np.zeros(2)
+
+
+@pytest.fixture
+def models():
+    import spacy
+
+    from rprec.app.inference import Models
+
+    nlp = spacy.blank("en")
+    # one term, the first two articles contain it and the last two don't
+    tfidf_vectors = csr_matrix(np.array([[1.0], [0.5], [0.0], [0.0]]))
+    doc2vec = FakeDoc2Vec([("a", 0.9), ("b", 0.1), ("c", -0.2), ("d", -0.5)])
+    return Models(nlp, FakeTfidf(np.array([1.0])), tfidf_vectors, doc2vec, list("abcd"))
+
+
+def test_only_positive_scores_are_returned(models):
+    from rprec.app.inference import similar_to_texts
+
+    [result] = similar_to_texts(models, ["pandas dataframes"], 4)
+    assert result["cosine"] == [("a", 1.0), ("b", 0.5)]
+    assert result["doc2vec"] == [("a", 0.9), ("b", 0.1)]
+
+
+def test_stopwords_only_text_has_no_similar_articles(models):
+    from rprec.app.inference import similar_to_texts
+
+    assert similar_to_texts(models, ["the of and"], 3) == [
+        {"cosine": [], "doc2vec": []}
+    ]
+
+
+@pytest.mark.parametrize(
+    "text, limit",
+    [("", 3), ("x" * 100_001, 3), ("pandas", 0), ("pandas", -1), ("pandas", 51)],
+)
+@pytest.mark.parametrize("method", ["cosine", "doc2vec"])
+def test_invalid_text_queries_are_rejected(method, text, limit):
+    from fastapi.testclient import TestClient
+
+    from rprec.app.main import app
+
+    response = TestClient(app).post(
+        f"/articles/similar/{method}/text/?limit={limit}", json={"text": text}
+    )
+    assert response.status_code == 422
+
+
+def test_a_failing_text_only_fails_its_own_query(monkeypatch, tmp_path):
+    import asyncio
+
+    from rprec.app import inference
+
+    def infer(texts, limit):
+        if "bad" in texts:
+            raise ValueError("[E088] Text of length 1200000 exceeds maximum")
+        return [{"cosine": [(text, 1.0)], "doc2vec": []} for text in texts]
+
+    batcher = inference.MicroBatcher(str(tmp_path), "postgresql://localhost/none")
+    monkeypatch.setattr(batcher, "_infer", infer)
+    monkeypatch.setattr(batcher, "preload", lambda generation=None: None)
+
+    async def query():
+        await batcher.start()
+        try:
+            return await asyncio.gather(
+                batcher.submit("good", 3),
+                batcher.submit("bad", 3),
+                batcher.submit("fine", 3),
+                return_exceptions=True,
+            )
+        finally:
+            await batcher.stop()
+
+    good, bad, fine = asyncio.run(query())
+    assert good == {"cosine": [("good", 1.0)], "doc2vec": []}
+    assert isinstance(bad, ValueError)
+    assert fine == {"cosine": [("fine", 1.0)], "doc2vec": []}